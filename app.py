@@ -0,0 +1,151 @@
+"""
+Explicit initialization of the game.
+
+Importing the modules of the game has no side effects, pygame, the logging and
+the window are only set up by the App, when they are first needed. Tools and
+headless simulations can import the game logic without opening a window.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+from datetime import datetime
+from functools import cached_property
+import pygame
+from capture import CaptureWriter
+from leaderboard import Leaderboard
+from pacing import FramePacer
+from telemetry import Telemetry
+from utils import ASSET_CACHE, CONFIG, BackgroundManager, screen_init
+
+
+class App:
+    """
+    The game resources shared by the views, created on first use.
+    """
+
+    def __init__(self, config=CONFIG, log_file: str = "game.log"):
+        """
+        Initialize the app, without creating any resources yet.
+
+        Parameters
+        ----------
+        config : Config, optional
+            The game config, by default CONFIG
+        log_file : str, optional
+            The file to write the debug log to, by default game.log
+        """
+        self.config = config
+        self.log_file = log_file
+        self.initialized = False
+        self.log_listener = None
+        self.vsync = False
+
+    def init(self):
+        """
+        Initialize pygame and the logging, only the first call has an effect.
+        """
+        if self.initialized:
+            return
+        self.initialized = True
+        pygame.init()
+        # Set the logging level, the log file is written on a background thread
+        log_queue = queue.SimpleQueue()
+        self.log_listener = logging.handlers.QueueListener(
+            log_queue, logging.FileHandler(self.log_file)
+        )
+        self.log_listener.start()
+        atexit.register(self.log_listener.stop)
+        logging.basicConfig(
+            level=logging.DEBUG, handlers=[logging.handlers.QueueHandler(log_queue)]
+        )
+        logging.debug(f"{datetime.now()} - Game initialized")
+
+    @cached_property
+    def screen(self) -> pygame.SurfaceType:
+        """The game window, opened on first use."""
+        self.init()
+        if self.config.frame_pacing == "vsync":
+            try:
+                screen = screen_init(
+                    self.config.window_title, self.config.resolution, vsync=True
+                )
+                self.vsync = True
+                return screen
+            except pygame.error as error:
+                print(f"Vsync is not available ({error}), pacing precisely instead")
+        return screen_init(self.config.window_title, self.config.resolution)
+
+    @cached_property
+    def canvas(self) -> pygame.SurfaceType:
+        """
+        The surface the game is drawn on, at the render resolution.
+        The screen itself, unless the render scale is set in the config.
+        """
+        screen = self.screen
+        if self.config.render_resolution == screen.get_size():
+            return screen
+        return pygame.Surface(self.config.render_resolution).convert()
+
+    def frame_pacer(self, fps: int = None, mode: str = None) -> FramePacer:
+        """
+        Create the frame pacer of a loop, the window has to be open.
+
+        Parameters
+        ----------
+        fps : int, optional
+            The target frame rate, by default the fps of the config
+        mode : str, optional
+            The pacing mode, by default the frame pacing of the config.
+            Vsync falls back to the precise pacing if the window didn't get it.
+
+        Returns
+        -------
+        FramePacer
+            The frame pacer.
+        """
+        mode = mode or self.config.frame_pacing
+        if mode == "vsync" and not self.vsync:
+            mode = "precise"
+        return FramePacer(mode, fps or self.config.fps)
+
+    @cached_property
+    def telemetry(self) -> Telemetry:
+        """The telemetry of the game, None if it is turned off in the config."""
+        if not self.config.telemetry:
+            return None
+        telemetry = Telemetry(
+            self.config.paths.telemetry,
+            fps=self.config.fps,
+            interval_ms=self.config.telemetry_interval_ms,
+            asset_loads=ASSET_CACHE.load_times,
+        )
+        atexit.register(telemetry.close)
+        return telemetry
+
+    @cached_property
+    def leaderboard(self) -> Leaderboard:
+        """The high scores, stored in the leaderboard database."""
+        leaderboard = Leaderboard(self.config.paths.leaderboard)
+        atexit.register(leaderboard.close)
+        return leaderboard
+
+    @cached_property
+    def backgrounds(self) -> BackgroundManager:
+        """The level backgrounds at the render resolution, decoded on first use."""
+        backgrounds = BackgroundManager(
+            self.config.max_level, self.config.render_resolution
+        )
+        atexit.register(backgrounds.close)
+        return backgrounds
+
+    @cached_property
+    def capture(self) -> CaptureWriter:
+        """The writer of the screenshots and the frame captures."""
+        capture = CaptureWriter()
+        atexit.register(capture.close)
+        return capture
+
+
+# The app of the running game
+APP = App()
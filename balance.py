@@ -0,0 +1,239 @@
+"""
+Difficulty balancing by playing headless games with bots.
+
+Sweeps the rules of a difficulty over a grid of values, plays a batch of bot
+games for every combination on a process pool, and reports the win rate, the
+time it took to reach every level and the score distribution as JSON.
+
+    python balance.py --difficulty medium --policy aim --games 2000 \\
+        --sweep base_enemy_speed=0.8,1,1.2 --sweep enemy_speed_increase=0.05,0.1
+"""
+import argparse
+import dataclasses
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from batch import ENTITY_SIZE, LOST, RUNNING, WON, BatchWorld
+from replay import DOWN, FIRE, UP
+from simulation import SHURIKEN_SIZE, TICK_RATE, Rules
+from config import CONFIG
+
+# The rules that can be swept, and the type of their values
+SWEEPABLE = {
+    "shuriken_speed": float,
+    "base_enemy_speed": float,
+    "base_enemy_hp": float,
+    "base_player_speed": float,
+    "enemy_speed_increase": float,
+    "max_level": int,
+    "player_hp": int,
+    "spawn_delay": float,
+}
+# The number of games played by one task of the pool
+CHUNK_SIZE = 512
+
+
+def idle_policy(games: BatchWorld, _rng: np.random.Generator) -> np.ndarray:
+    """Never move and never fire."""
+    return np.zeros(games.count, dtype=np.int64)
+
+
+def random_policy(games: BatchWorld, rng: np.random.Generator) -> np.ndarray:
+    """Hold random keys every tick."""
+    return rng.integers(FIRE << 1, size=games.count)
+
+
+def aim_policy(games: BatchWorld, _rng: np.random.Generator) -> np.ndarray:
+    """Line up the shurikens with the nearest enemy and fire constantly."""
+    nearest = games.enemy_x.argmin(axis=1)
+    enemy_y = games.enemy_y[np.arange(games.count), nearest] + ENTITY_SIZE / 2
+    shuriken_y = games.player_y + ENTITY_SIZE / 2 + SHURIKEN_SIZE[1] / 2
+    offset = enemy_y - shuriken_y
+    return FIRE | np.where(offset < -4, UP, 0) | np.where(offset > 4, DOWN, 0)
+
+
+POLICIES = {"idle": idle_policy, "random": random_policy, "aim": aim_policy}
+
+
+def play_games(
+    rules: Rules, seeds: list[int], policy: str, max_ticks: int, size: tuple[int, int]
+) -> dict:
+    """
+    Play a batch of games, runs in a worker process.
+
+    Parameters
+    ----------
+    rules : Rules
+        The rules of the games.
+    seeds : list[int]
+        The seed of every game.
+    policy : str
+        The name of the bot playing the games, a key of POLICIES.
+    max_ticks : int
+        The number of ticks after which a game is cut off.
+    size : tuple[int, int]
+        The width and height of the playing field.
+
+    Returns
+    -------
+    dict
+        The outcome, the final score and the length of every game, and the tick
+        every level was first reached in, -1 if it wasn't. The final score of a
+        game cut off at max_ticks is the score it had reached by then.
+    """
+    games = BatchWorld(rules, size, seeds)
+    play = POLICIES[policy]
+    rng = np.random.default_rng(seeds[0])
+    rows = np.arange(games.count)
+    level_ticks = np.full((games.count, rules.max_level + 2), -1, dtype=np.int64)
+    level_ticks[:, 1] = 0
+    for _ in range(max_ticks):
+        if not games.running.any():
+            break
+        games.step(play(games, rng))
+        # A big swarm can score several levels at once, count those as the last
+        level = np.minimum(games.level, rules.max_level + 1)
+        reached = level_ticks[rows, level] < 0
+        level_ticks[rows[reached], level[reached]] = games.ticks[reached]
+    return {
+        "outcome": games.outcome,
+        "final_score": games.reached_score,
+        "ticks": games.ticks,
+        "level_ticks": level_ticks,
+    }
+
+
+def summarize(results: list[dict]) -> dict:
+    """
+    Aggregate the games of one combination of rules.
+
+    Parameters
+    ----------
+    results : list[dict]
+        The results of the batches of play_games.
+
+    Returns
+    -------
+    dict
+        The outcome rates, the score percentiles, the game length and the mean
+        time it took to reach every level, of the games that reached it.
+    """
+    outcome = np.concatenate([result["outcome"] for result in results])
+    final_score = np.concatenate([result["final_score"] for result in results])
+    ticks = np.concatenate([result["ticks"] for result in results])
+    level_ticks = np.concatenate([result["level_ticks"] for result in results])
+    levels = {}
+    for level in range(2, level_ticks.shape[1]):
+        reached = level_ticks[:, level] >= 0
+        levels[str(level)] = {
+            "reached": float(reached.mean()),
+            "seconds": (
+                float(level_ticks[reached, level].mean() / TICK_RATE)
+                if reached.any()
+                else None
+            ),
+        }
+    return {
+        "games": len(outcome),
+        "win_rate": float(np.mean(outcome == WON)),
+        "loss_rate": float(np.mean(outcome == LOST)),
+        "cut_off_rate": float(np.mean(outcome == RUNNING)),
+        "game_seconds": float(ticks.mean() / TICK_RATE),
+        "final_score": {
+            "mean": float(final_score.mean()),
+            "p10": float(np.percentile(final_score, 10)),
+            "p50": float(np.percentile(final_score, 50)),
+            "p90": float(np.percentile(final_score, 90)),
+            "max": int(final_score.max()),
+        },
+        "time_to_level": levels,
+    }
+
+
+def parse_sweep(value: str) -> tuple[str, list]:
+    """Parse a name=value,value,... sweep argument."""
+    name, _, values = value.partition("=")
+    if name not in SWEEPABLE or not values:
+        raise argparse.ArgumentTypeError(
+            f"Expected name=value,value,... with a name of {', '.join(SWEEPABLE)}"
+        )
+    return name, [SWEEPABLE[name](item) for item in values.split(",")]
+
+
+def main():
+    """Run the sweep and print the report as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--difficulty", default="medium")
+    parser.add_argument(
+        "--sweep", type=parse_sweep, action="append", default=[], metavar="NAME=VALUES"
+    )
+    parser.add_argument("--policy", choices=list(POLICIES), default="aim")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--max-seconds", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="write the report to a file too")
+    args = parser.parse_args()
+
+    base = Rules.for_difficulty(
+        args.difficulty,
+        CONFIG.max_level,
+        CONFIG.difficulties,
+        swarm_size=CONFIG.swarm_size,
+        max_shurikens=CONFIG.max_shurikens,
+    )
+    names = [name for name, _ in args.sweep]
+    grid = [
+        dataclasses.replace(base, **dict(zip(names, values)))
+        for values in itertools.product(*(values for _, values in args.sweep))
+    ]
+    # Every combination plays the same seeds, so they are compared on equal terms
+    chunks = [
+        list(range(start, min(start + CHUNK_SIZE, args.seed + args.games)))
+        for start in range(args.seed, args.seed + args.games, CHUNK_SIZE)
+    ]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = [
+            [
+                pool.submit(
+                    play_games,
+                    rules,
+                    seeds,
+                    args.policy,
+                    args.max_seconds * TICK_RATE,
+                    CONFIG.logical_resolution,
+                )
+                for seeds in chunks
+            ]
+            for rules in grid
+        ]
+        combinations = [
+            {
+                "rules": dataclasses.asdict(rules),
+                **summarize([future.result() for future in rule_futures]),
+            }
+            for rules, rule_futures in zip(grid, futures)
+        ]
+    report = {
+        "difficulty": args.difficulty,
+        "policy": args.policy,
+        "games": args.games,
+        "seed": args.seed,
+        "workers": args.workers,
+        "seconds": round(time.perf_counter() - start, 3),
+        "sweep": dict(args.sweep),
+        "combinations": combinations,
+    }
+    report_json = json.dumps(report, indent=2)
+    print(report_json)
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as output_file:
+            output_file.write(report_json + "\n")
+
+
+if __name__ == "__main__":
+    main()
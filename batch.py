@@ -0,0 +1,371 @@
+"""
+Batched simulation of many games in lockstep.
+
+The BatchWorld plays K independent games by the rules of the World. Every
+instance has its own rules, seed and inputs, and the state lives in (K,) and
+(K, slots) NumPy arrays, so one step advances all of them with vectorized
+operations, e.g. for balancing sweeps over thousands of games.
+
+Each instance draws from its own splitmix64 stream, so it plays the same
+regardless of the other instances in the batch. The streams differ from the
+random.Random of the World, so the same seed gives a different game than in
+the World, under the same rules. The players are keyboard controlled, an
+action is a bitmask of the keys held, with the bits of the replay format.
+
+Measure the speed of the batch with random players:
+
+    python batch.py --difficulty hard --games 4096
+"""
+import argparse
+import time
+import numpy as np
+from entities import TOP_MARGIN
+from replay import DOWN, FIRE, LEFT, RIGHT, UP
+from simulation import SHURIKEN_SIZE, TICK_DT, Rules
+
+# The width and height of the player and the enemies
+ENTITY_SIZE = 96
+# The outcomes of the instances
+RUNNING, WON, LOST = 0, 1, -1
+
+_GAMMA = 0x9E3779B97F4A7C15
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def splitmix64(states: np.ndarray, count: int) -> np.ndarray:
+    """
+    Draw the next numbers of many splitmix64 streams at once.
+
+    Parameters
+    ----------
+    states : np.ndarray
+        The uint64 states of the streams, advanced in place.
+    count : int
+        The number of numbers to draw from every stream.
+
+    Returns
+    -------
+    np.ndarray
+        The uint64 numbers, one row per stream.
+    """
+    steps = np.arange(1, count + 1, dtype=np.uint64) * np.uint64(_GAMMA)
+    numbers = states[:, None] + steps
+    states += np.uint64(_GAMMA * count % 2**64)
+    numbers = (numbers ^ (numbers >> np.uint64(30))) * _MIX_1
+    numbers = (numbers ^ (numbers >> np.uint64(27))) * _MIX_2
+    return numbers ^ (numbers >> np.uint64(31))
+
+
+class BatchWorld:
+    """
+    The state and the rules of many games, advanced together.
+    """
+
+    def __init__(self, rules, size: tuple[int, int], seeds):
+        """
+        Initialize the games.
+
+        Parameters
+        ----------
+        rules : Rules or list[Rules]
+            The rules of all games, or of every game. The swarm size has to be
+            the same for all games.
+        size : tuple[int, int]
+            The width and height of the playing field.
+        seeds : list[int] or np.ndarray
+            The seed of every game, the number of seeds is the batch size.
+
+        Raises
+        ------
+        ValueError
+            If the games have different swarm sizes.
+        """
+        seeds = np.asarray(seeds, dtype=np.uint64)
+        count = len(seeds)
+        if isinstance(rules, Rules):
+            rules = [rules] * count
+        if len({rule.swarm_size for rule in rules}) > 1:
+            raise ValueError("All games need the same swarm size")
+        self.size = size
+        self.width, self.height = size
+        self.count = count
+        swarm_size = rules[0].swarm_size
+        self.swarm_size = swarm_size
+        self.max_shurikens = max(rule.shuriken_capacity for rule in rules)
+
+        def column(name: str, dtype=np.float64) -> np.ndarray:
+            return np.array([getattr(rule, name) for rule in rules], dtype=dtype)
+
+        # The level tables of every game, padded to the same number of levels
+        # with the rules of the levels past the last one
+        width = max(rule.max_level for rule in rules) + 2
+
+        def table(name: str, dtype=np.float64) -> np.ndarray:
+            rows = [getattr(rule.levels, name) for rule in rules]
+            return np.array(
+                [row + row[-1:] * (width - len(row)) for row in rows], dtype=dtype
+            )
+
+        # The rules of every game
+        self.shuriken_speed = column("shuriken_speed")
+        self.player_speed = column("base_player_speed")
+        self.enemy_speed_increase = column("enemy_speed_increase")
+        self.max_level = column("max_level", np.int64)
+        self.level_enemy_speed = table("enemy_speed")
+        self.level_enemy_hp = table("enemy_hp")
+        self.level_spawn_distance = table("spawn_distance")
+        self.level_max_shurikens = table("max_shurikens", np.int64)
+        self.games = np.arange(count)
+
+        # The state of every game
+        self.rng_state = seeds.copy()
+        self.ticks = np.zeros(count, dtype=np.int64)
+        self.score = np.zeros(count, dtype=np.int64)
+        self.level = np.ones(count, dtype=np.int64)
+        self.final_score = np.zeros(count, dtype=np.int64)
+        self.outcome = np.full(count, RUNNING, dtype=np.int8)
+        self.player_x = np.full(count, 100.0)
+        self.player_y = np.full(count, self.height / 2)
+        self.player_hp = column("player_hp", np.int64)
+        # Space out the swarm, so the enemies don't arrive all at once
+        spacing = self.width / swarm_size
+        self.enemy_x = np.tile(self.width + np.arange(swarm_size) * spacing, (count, 1))
+        self.enemy_y = self._randint(
+            0, self.height - ENTITY_SIZE, np.ones(count, dtype=bool)
+        ).astype(np.float64)
+        self.enemy_speed = np.repeat(self.level_enemy_speed[:, 1:2], swarm_size, 1)
+        self.enemy_hp = np.repeat(self.level_enemy_hp[:, 1:2], swarm_size, 1)
+        self.shuriken_x = np.zeros((count, self.max_shurikens))
+        self.shuriken_y = np.zeros((count, self.max_shurikens))
+        self.shuriken_active = np.zeros((count, self.max_shurikens), dtype=bool)
+
+    @property
+    def running(self) -> np.ndarray:
+        """Boolean mask of the games that aren't over yet."""
+        return self.outcome == RUNNING
+
+    @property
+    def reached_score(self) -> np.ndarray:
+        """
+        The final score of the finished games, and the score the games still
+        running have reached, e.g. the ones cut off at the tick limit.
+        """
+        return np.where(self.running, self.score, self.final_score)
+
+    def step(self, actions: np.ndarray, dt: float = TICK_DT) -> np.ndarray:
+        """
+        Advance every running game by one tick.
+
+        Parameters
+        ----------
+        actions : np.ndarray
+            The bitmask of the keys held in every game.
+        dt : float, optional
+            The length of the tick in speed units, by default TICK_DT
+
+        Returns
+        -------
+        np.ndarray
+            The outcome of every game: RUNNING, WON or LOST.
+        """
+        running = self.running
+        live = running[:, None]
+        actions = np.asarray(actions)
+        self.ticks += running
+
+        # Move the players
+        step = self.player_speed * dt * running
+        self.player_x += step * (((actions & RIGHT) > 0) - 1.0 * ((actions & LEFT) > 0))
+        self.player_y += step * (((actions & DOWN) > 0) - 1.0 * ((actions & UP) > 0))
+        np.clip(self.player_x, 0, self.width - ENTITY_SIZE, out=self.player_x)
+        np.clip(self.player_y, TOP_MARGIN, self.height - ENTITY_SIZE, out=self.player_y)
+
+        # Move the enemies
+        np.clip(self.enemy_y, TOP_MARGIN, self.height - ENTITY_SIZE, out=self.enemy_y)
+        self.enemy_x -= self.enemy_speed * dt * live
+
+        # Score the enemies that got off the screen
+        escaped = live & (self.enemy_x < -ENTITY_SIZE)
+        self.score += escaped.sum(axis=1)
+        self._update_level(running)
+        self._speed_up(escaped)
+        self._respawn(escaped, 50, self.height - ENTITY_SIZE)
+
+        # Check for collisions with the player, every hit resets the score
+        collided = live & self._overlaps(
+            self.player_x[:, None],
+            self.player_y[:, None],
+            ENTITY_SIZE,
+            ENTITY_SIZE,
+        )
+        hits = collided.sum(axis=1)
+        hit = hits > 0
+        # Only the first hit of a tick sees the score, the later ones see 0
+        self.final_score = np.where(
+            hit, np.where(hits == 1, self.score, 0), self.final_score
+        )
+        self.score[hit] = 0
+        self.level[hit] = 1
+        self.player_hp -= hits
+        self.enemy_speed = np.where(
+            collided, self.level_enemy_speed[:, 1:2], self.enemy_speed
+        )
+        self._respawn(collided, 0, self.height - (50 + ENTITY_SIZE))
+
+        # Check if the players are dead
+        lost = running & (self.player_hp <= 0)
+        self.outcome[lost] = LOST
+        running &= ~lost
+        live = running[:, None]
+
+        # Fire a shuriken from the first free slot, if the level allows another one
+        active = self.shuriken_active
+        firing = (
+            running
+            & ((actions & FIRE) > 0)
+            & (active.sum(axis=1) < self._level_values(self.level_max_shurikens))
+        )
+        rows = np.flatnonzero(firing)
+        slots = active[rows].argmin(axis=1)
+        self.shuriken_x[rows, slots] = self.player_x[rows] + ENTITY_SIZE
+        self.shuriken_y[rows, slots] = self.player_y[rows] + ENTITY_SIZE / 2
+        active[rows, slots] = True
+
+        # Move the shurikens, drop the ones that left the screen
+        self.shuriken_x += self.shuriken_speed[:, None] * dt * (active & live)
+        active &= ~(self.shuriken_x > self.width)
+
+        # Check for shuriken hits slot by slot, a shuriken hits at most one enemy
+        for slot in range(self.max_shurikens):
+            flying = active[:, slot] & running
+            if not flying.any():
+                continue
+            struck = flying[:, None] & self._overlaps(
+                self.shuriken_x[:, slot, None],
+                self.shuriken_y[:, slot, None],
+                *SHURIKEN_SIZE,
+            )
+            rows = np.flatnonzero(struck.any(axis=1))
+            enemies = struck[rows].argmax(axis=1)
+            active[rows, slot] = False
+            self.enemy_hp[rows, enemies] -= 1
+            killed = self.enemy_hp[rows, enemies] <= 0
+            rows, enemies = rows[killed], enemies[killed]
+            self.score[rows] += 2
+            self._update_level(running)
+            respawned = np.zeros_like(struck)
+            respawned[rows, enemies] = True
+            self._speed_up(respawned)
+            self._respawn(respawned, 0, self.height - ENTITY_SIZE)
+
+        # Check if max level is reached
+        won = running & (self.level > self.max_level)
+        self.outcome[won] = WON
+        self.final_score = np.where(won, self.score, self.final_score)
+        return self.outcome
+
+    def play(self, policy, max_ticks: int) -> np.ndarray:
+        """
+        Step the games until all of them are over.
+
+        Parameters
+        ----------
+        policy : callable
+            Gives the actions of every game from the batch.
+        max_ticks : int
+            The number of ticks after which to stop anyway.
+
+        Returns
+        -------
+        np.ndarray
+            The outcome of every game, RUNNING for the ones cut off.
+        """
+        for _ in range(max_ticks):
+            if not self.running.any():
+                break
+            self.step(policy(self))
+        return self.outcome
+
+    def _overlaps(
+        self, x: np.ndarray, y: np.ndarray, width: float, height: float
+    ) -> np.ndarray:
+        """Check which enemies overlap the boxes, one box per game."""
+        return (
+            (self.enemy_x < x + width)
+            & (x < self.enemy_x + ENTITY_SIZE)
+            & (self.enemy_y < y + height)
+            & (y < self.enemy_y + ENTITY_SIZE)
+        )
+
+    def _update_level(self, running: np.ndarray):
+        """Update the level of the running games from their score."""
+        self.level = np.where(running, self.score // 10 + 1, self.level)
+
+    def _level_values(self, table: np.ndarray) -> np.ndarray:
+        """Look up the values of the current level of every game in a level table."""
+        return table[self.games, np.minimum(self.level, self.max_level + 1)]
+
+    def _speed_up(self, mask: np.ndarray):
+        """Speed up the selected enemies, to at least the speed of the level."""
+        faster = np.maximum(
+            self.enemy_speed + self.enemy_speed_increase[:, None],
+            self._level_values(self.level_enemy_speed)[:, None],
+        )
+        self.enemy_speed = np.where(mask, faster, self.enemy_speed)
+
+    def _respawn(self, mask: np.ndarray, y_min: int, y_max: int):
+        """
+        Move the selected enemies back past the right edge, by the spawn delay of
+        the level, with the full HP of the level.
+        """
+        rows = mask.any(axis=1)
+        if not rows.any():
+            return
+        heights = self._randint(y_min, y_max, rows)
+        self.enemy_y[rows] = np.where(mask[rows], heights, self.enemy_y[rows])
+        distance = self._level_values(self.level_spawn_distance)[:, None]
+        self.enemy_x = np.where(
+            mask, self.width + distance * self.enemy_speed, self.enemy_x
+        )
+        self.enemy_hp = np.where(
+            mask, self._level_values(self.level_enemy_hp)[:, None], self.enemy_hp
+        )
+
+    def _randint(self, low: int, high: int, rows: np.ndarray) -> np.ndarray:
+        """Draw a random integer for every enemy slot of the selected games."""
+        states = self.rng_state[rows]
+        numbers = splitmix64(states, self.swarm_size)
+        self.rng_state[rows] = states
+        # The top 53 bits as a float in [0, 1)
+        fractions = (numbers >> np.uint64(11)).astype(np.float64) * 2.0**-53
+        return low + (fractions * (high - low + 1)).astype(np.int64)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play random games in a batch.")
+    parser.add_argument("--difficulty", default="medium")
+    parser.add_argument("--games", type=int, default=4096)
+    parser.add_argument("--max-ticks", type=int, default=36_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    batch = BatchWorld(
+        Rules.for_difficulty(args.difficulty),
+        (800, 800),
+        np.arange(args.seed, args.seed + args.games),
+    )
+    rng = np.random.default_rng(args.seed)
+    start = time.perf_counter()
+    outcome = batch.play(
+        lambda games: rng.integers(FIRE << 1, size=games.count), args.max_ticks
+    )
+    elapsed = time.perf_counter() - start
+    print(
+        f"Won: {np.sum(outcome == WON)}, lost: {np.sum(outcome == LOST)},"
+        f" cut off: {np.sum(outcome == RUNNING)} of {args.games} games"
+    )
+    print(f"Final score: mean {batch.reached_score.mean():.1f}")
+    print(
+        f"Ran {batch.ticks.sum()} ticks in {elapsed:.3f} s"
+        f" ({batch.ticks.sum() / max(elapsed, 1e-9):.0f} ticks/s)"
+    )
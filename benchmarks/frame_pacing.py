@@ -0,0 +1,78 @@
+"""
+Benchmark of the frame pacing modes.
+
+Paces empty frames with each mode and measures how far the frame times stray
+from the target frame time, and how much of each frame is spent on the CPU
+waiting. Vsync needs a real display, so it isn't measured here.
+
+Usage: python -m benchmarks.frame_pacing [--frames 300] [--fps 60 144]
+"""
+import argparse
+import os
+import time
+import numpy as np
+import pygame
+from pacing import FramePacer
+
+MODES = ("fixed", "precise")
+
+
+def bench_mode(mode: str, fps: int, frames: int) -> dict:
+    """
+    Time the frames of a pacing mode.
+
+    Parameters
+    ----------
+    mode : str
+        The pacing mode.
+    fps : int
+        The target frame rate.
+    frames : int
+        The number of frames to pace.
+
+    Returns
+    -------
+    dict
+        The mean frame time, the mean and the 99th percentile deviation from
+        the target frame time in milliseconds, and the CPU time per frame.
+    """
+    pacer = FramePacer(mode, fps)
+    timings = np.empty(frames)
+    cpu_start = time.process_time()
+    for index in range(frames):
+        timings[index] = pacer.wait()
+    cpu_ms = (time.process_time() - cpu_start) * 1000 / frames
+    deviation = np.abs(timings - 1000 / fps)
+    return {
+        "mean_ms": float(timings.mean()),
+        "jitter_ms": float(deviation.mean()),
+        "jitter_p99_ms": float(np.percentile(deviation, 99)),
+        "cpu_ms": cpu_ms,
+    }
+
+
+def main():
+    """Run the benchmark and print the results as a table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--fps", type=int, nargs="+", default=[30, 60, 144])
+    args = parser.parse_args()
+
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.init()
+    print(
+        f"{'mode':>8} {'fps':>5} {'frame mean':>11} {'jitter':>8}"
+        f" {'jitter p99':>11} {'cpu':>7}   (ms)"
+    )
+    for fps in args.fps:
+        for mode in MODES:
+            result = bench_mode(mode, fps, args.frames)
+            print(
+                f"{mode:>8} {fps:>5} {result['mean_ms']:>11.3f}"
+                f" {result['jitter_ms']:>8.3f} {result['jitter_p99_ms']:>11.3f}"
+                f" {result['cpu_ms']:>7.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Benchmark of whole frames with scripted scenarios.
+
+Runs the same work as a frame of the game loop, the menu or the end screens on
+a headless display, and reports the frame rate, the frame time percentiles and
+the memory allocated per frame as JSON, to compare builds against a baseline.
+
+Usage: python -m benchmarks.frames [--frames 600] [--scenarios idle menu_hover]
+    [--output baseline.json]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pygame
+import game_logic
+from app import APP
+from game_logic import render
+from simulation import TICK_DT, Inputs, Rules, World
+from utils import CONFIG
+from views import menu
+from views.game_ui import GameUI
+from views.lose import lose
+from views.renderer import DirtyRenderer
+from views.win import win
+
+SEED = 0
+
+
+def game_frames(world: World, script) -> callable:
+    """
+    Build the frame function of a game scenario.
+
+    Parameters
+    ----------
+    world : World
+        The world to play in.
+    script : callable
+        Gives the inputs of a frame from the frame number.
+
+    Returns
+    -------
+    callable
+        Runs one frame: advances the world by a tick and renders it.
+    """
+    canvas = APP.canvas
+    game_ui = GameUI(canvas, scale=CONFIG.view_scale[1])
+    renderer = DirtyRenderer(
+        canvas,
+        window=APP.screen if canvas is not APP.screen else None,
+        smooth=CONFIG.smooth_upscale,
+        scale=CONFIG.view_scale,
+    )
+
+    def frame(index: int):
+        world.step(script(index), TICK_DT)
+        render(world, game_ui, renderer)
+
+    return frame
+
+
+def idle() -> callable:
+    """The game running without any input, the player doesn't die."""
+    rules = Rules.for_difficulty("medium", player_hp=10**9)
+    world = World(rules, CONFIG.logical_resolution, seed=SEED)
+    return game_frames(world, lambda index: Inputs())
+
+
+def max_shurikens() -> callable:
+    """The player firing constantly, with as many shurikens in flight as fit."""
+    rules = Rules.for_difficulty(
+        "medium", swarm_size=8, max_shurikens=64, player_hp=10**9
+    )
+    world = World(rules, CONFIG.logical_resolution, seed=SEED)
+    return game_frames(
+        world,
+        lambda index: Inputs(up=index % 120 < 60, down=index % 120 >= 60, fire=True),
+    )
+
+
+def level_10() -> callable:
+    """The last level on hard, with the enemies sped up as they are by then."""
+    rules = Rules.for_difficulty("hard", swarm_size=8, player_hp=10**9)
+    world = World(rules, CONFIG.logical_resolution, seed=SEED)
+    world.score = (rules.max_level - 1) * 10
+    world.level = rules.max_level
+    world.enemies.speed[:] = rules.base_enemy_speed + 40 * rules.enemy_speed_increase
+    return game_frames(
+        world,
+        lambda index: Inputs(up=index % 90 < 45, down=index % 90 >= 45, fire=True),
+    )
+
+
+def menu_hover() -> callable:
+    """
+    The mouse sweeping over the main menu, the highlight changes every frame.
+    Each frame handles the queued events and redraws like a pass of menu_loop.
+    """
+    option_rects = menu.draw_menu()
+
+    def frame(index: int):
+        position = option_rects[index % len(option_rects)].center
+        pygame.event.post(
+            pygame.event.Event(
+                pygame.MOUSEMOTION, pos=position, rel=(0, 0), buttons=(0, 0, 0)
+            )
+        )
+        highlighted = None
+        for event in pygame.event.get():
+            if event.type == pygame.MOUSEMOTION:
+                for i, rect in enumerate(option_rects):
+                    if rect.collidepoint(event.pos):
+                        highlighted = i
+        menu.draw_menu(highlighted)
+
+    return frame
+
+
+def end_screen(screen_function) -> callable:
+    """
+    Build the frame function of the win or lose screen.
+    A key press is queued before every frame, so the screen returns after one frame.
+    """
+
+    def frame(index: int):
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+        screen_function(APP.screen, index)
+
+    return frame
+
+
+SCENARIOS = {
+    "idle": idle,
+    "max_shurikens": max_shurikens,
+    "level_10": level_10,
+    "menu_hover": menu_hover,
+    "win_screen": lambda: end_screen(win),
+    "lose_screen": lambda: end_screen(lose),
+}
+
+
+def measure(setup: callable, frames: int, warmup: int = 30) -> dict:
+    """
+    Time the frames of a scenario, then trace their allocations in a second run.
+
+    Parameters
+    ----------
+    setup : callable
+        Builds the frame function of the scenario.
+    frames : int
+        The number of frames to measure.
+    warmup : int, optional
+        The number of frames to run before measuring, by default 30.
+        Fills the caches, so the first frames don't skew the results.
+
+    Returns
+    -------
+    dict
+        The frame rate, the frame time percentiles in milliseconds and the
+        allocations per frame in bytes.
+    """
+    frame = setup()
+    for index in range(warmup):
+        frame(index)
+    timings = np.empty(frames)
+    for index in range(frames):
+        start = time.perf_counter()
+        frame(warmup + index)
+        timings[index] = time.perf_counter() - start
+    timings *= 1000
+
+    # Tracing slows the frames down, so allocations are measured separately
+    frame = setup()
+    for index in range(warmup):
+        frame(index)
+    peaks = np.empty(frames)
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for index in range(frames):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        frame(warmup + index)
+        peaks[index] = tracemalloc.get_traced_memory()[1] - before
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    return {
+        "fps": frames / (timings.sum() / 1000),
+        "frame_ms": {
+            "mean": float(timings.mean()),
+            "p50": float(np.percentile(timings, 50)),
+            "p95": float(np.percentile(timings, 95)),
+            "p99": float(np.percentile(timings, 99)),
+            "max": float(timings.max()),
+        },
+        "alloc_bytes_per_frame": {
+            "mean": float(peaks.mean()),
+            "p95": float(np.percentile(peaks, 95)),
+            "max": float(peaks.max()),
+        },
+        "retained_bytes": int(retained),
+    }
+
+
+def main():
+    """Run the scenarios and print the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--output", help="write the results to a file too")
+    args = parser.parse_args()
+
+    # Run without a window or a sound card
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    APP.init()
+    game_logic.load_images()
+    results = {
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "platform": sys.platform,
+        "video_driver": pygame.display.get_driver(),
+        "frames": args.frames,
+        "scenarios": {
+            name: measure(SCENARIOS[name], args.frames) for name in args.scenarios
+        },
+    }
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as output_file:
+            output_file.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
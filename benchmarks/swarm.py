@@ -0,0 +1,131 @@
+"""
+Benchmark of the swarm mode.
+
+Measures how the simulation tick time grows with the size of the swarm, and
+compares the spatial hash broadphase with checking every shuriken-enemy pair.
+
+Usage: python -m benchmarks.swarm [--ticks 600] [--sizes 1 10 100 1000]
+"""
+import argparse
+import statistics
+import time
+import numpy as np
+from collision import SpatialHash, brute_force_pairs
+from entities import EntityStore
+from simulation import Inputs, Rules, World
+
+FIELD_SIZE = (800, 800)
+
+
+def scripted_inputs(tick: int) -> Inputs:
+    """Move the player up and down while firing constantly."""
+    return Inputs(up=tick % 120 < 60, down=tick % 120 >= 60, fire=True)
+
+
+def bench_world(swarm_size: int, ticks: int, max_shurikens: int) -> dict:
+    """
+    Time the ticks of a world with a given swarm size.
+
+    Parameters
+    ----------
+    swarm_size : int
+        The number of enemies.
+    ticks : int
+        The number of ticks to run.
+    max_shurikens : int
+        The number of shurikens allowed in flight.
+
+    Returns
+    -------
+    dict
+        The mean and 95th percentile tick times in milliseconds.
+    """
+    rules = Rules.for_difficulty(
+        "medium", swarm_size=swarm_size, max_shurikens=max_shurikens, player_hp=10**9
+    )
+    world = World(rules, FIELD_SIZE, seed=swarm_size)
+    timings = []
+    for tick in range(ticks):
+        inputs = scripted_inputs(tick)
+        start = time.perf_counter()
+        world.step(inputs)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "mean_ms": statistics.fmean(timings),
+        "p95_ms": timings[int(len(timings) * 0.95)],
+    }
+
+
+def random_store(
+    count: int, size: tuple[int, int], field: float, rng: np.random.Generator
+):
+    """Fill a store with entities at random positions on a square field."""
+    store = EntityStore(count)
+    for x, y in rng.uniform(0, field, (count, 2)):
+        store.add(x, y, 1, 1, size)
+    return store
+
+
+def bench_broadphase(swarm_size: int, repeat: int = 20) -> dict:
+    """
+    Time finding the colliding pairs between a swarm and a quarter as many shurikens,
+    spread over a field growing with the swarm.
+
+    Parameters
+    ----------
+    swarm_size : int
+        The number of enemies.
+    repeat : int, optional
+        The number of times to repeat the measurement, by default 20
+
+    Returns
+    -------
+    dict
+        The mean times of the spatial hash and the brute force checks in milliseconds.
+    """
+    rng = np.random.default_rng(swarm_size)
+    # Keep the density of a 50 enemy swarm on screen, as the swarm is spread out
+    field = FIELD_SIZE[0] * max(swarm_size / 50, 1) ** 0.5
+    enemies = random_store(swarm_size, (96, 96), field, rng)
+    shurikens = random_store(max(swarm_size // 4, 1), (32, 32), field, rng)
+    grid = SpatialHash()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        grid.build(enemies)
+        grid.query_pairs(shurikens)
+    hashed = (time.perf_counter() - start) * 1000 / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        brute_force_pairs(shurikens, enemies)
+    brute = (time.perf_counter() - start) * 1000 / repeat
+    return {"spatial_hash_ms": hashed, "brute_force_ms": brute}
+
+
+def main():
+    """Run the benchmark and print the results as a table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--shurikens", type=int, default=3)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1, 10, 50, 100, 250, 500, 1000, 2000]
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'swarm':>6} {'tick mean':>10} {'tick p95':>10}"
+        f" {'pairs hash':>11} {'pairs brute':>12}   (ms)"
+    )
+    for size in args.sizes:
+        world = bench_world(size, args.ticks, args.shurikens)
+        pairs = bench_broadphase(size)
+        print(
+            f"{size:>6} {world['mean_ms']:>10.3f} {world['p95_ms']:>10.3f}"
+            f" {pairs['spatial_hash_ms']:>11.3f} {pairs['brute_force_ms']:>12.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
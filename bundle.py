@@ -0,0 +1,280 @@
+"""
+Single-file asset bundle.
+
+The packer concatenates the asset files into one archive, behind an index of
+name -> (offset, length, format). The loader memory-maps the archive and hands
+out slices of it without copying, so starting the game opens one file instead
+of every loose asset.
+
+Build the bundle from the assets folder with:
+
+    python bundle.py [--source assets] [--output assets.bundle]
+"""
+import argparse
+import io
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import NamedTuple
+
+# Magic, format version and size of the index
+HEADER = struct.Struct("<4sHI")
+MAGIC = b"NVBA"
+VERSION = 1
+
+
+class BundleEntry(NamedTuple):
+    """
+    The location of an asset in the bundle.
+    """
+
+    offset: int
+    length: int
+    format: str
+
+
+def pack(source: str, output: str) -> int:
+    """
+    Pack the files of a folder into a bundle.
+
+    Parameters
+    ----------
+    source : str
+        The folder to pack, the entries are named by their path relative to it.
+    output : str
+        The path of the bundle to write.
+
+    Returns
+    -------
+    int
+        The number of packed files.
+    """
+    files = []
+    for root, dirs, names in os.walk(source):
+        # Walk in a fixed order, so the same assets always give the same bundle
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            files.append((os.path.relpath(path, source).replace(os.sep, "/"), path))
+
+    # The offsets are relative to the payload, which starts right after the index
+    index = {}
+    offset = 0
+    for name, path in files:
+        length = os.path.getsize(path)
+        extension = os.path.splitext(name)[1].lstrip(".").lower()
+        index[name] = (offset, length, extension)
+        offset += length
+    index_bytes = json.dumps(index, sort_keys=True).encode("utf8")
+
+    # Write to a temporary file first, so a running game never sees a partial bundle
+    directory = os.path.dirname(os.path.abspath(output))
+    with tempfile.NamedTemporaryFile(
+        dir=directory, suffix=".tmp", delete=False
+    ) as bundle_file:
+        bundle_file.write(HEADER.pack(MAGIC, VERSION, len(index_bytes)))
+        bundle_file.write(index_bytes)
+        for _, path in files:
+            with open(path, "rb") as asset_file:
+                bundle_file.write(asset_file.read())
+    os.chmod(bundle_file.name, 0o644)
+    os.replace(bundle_file.name, output)
+    return len(files)
+
+
+class BundleFile(io.RawIOBase):
+    """
+    Read-only file over an asset in the bundle.
+    Reads slice the memory map directly, the asset is never copied as a whole.
+    """
+
+    def __init__(self, view: memoryview):
+        """
+        Initialize the file.
+
+        Parameters
+        ----------
+        view : memoryview
+            The bytes of the asset.
+        """
+        super().__init__()
+        self.view = view
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        """Read into a buffer, returns the number of bytes read."""
+        chunk = self.view[self.position : self.position + len(buffer)]
+        buffer[: len(chunk)] = chunk
+        self.position += len(chunk)
+        return len(chunk)
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to size bytes, the rest of the asset by default."""
+        end = len(self.view) if size is None or size < 0 else self.position + size
+        chunk = self.view[self.position : end]
+        self.position += len(chunk)
+        return bytes(chunk)
+
+    def readall(self) -> bytes:
+        return self.read()
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        """Move to a position, relative to the start, the position or the end."""
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = len(self.view) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position: {position}")
+        self.position = position
+        return position
+
+    def tell(self) -> int:
+        return self.position
+
+    def close(self):
+        """Release the view, the bundle stays mapped."""
+        if not self.closed:
+            self.view.release()
+        super().close()
+
+
+class AssetBundle:
+    """
+    Read-only, memory-mapped view of a bundle.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open a bundle and read its index.
+
+        Parameters
+        ----------
+        path : str
+            The path of the bundle.
+
+        Raises
+        ------
+        ValueError
+            If the file is not a bundle of a supported version.
+        """
+        self.path = os.path.abspath(path)
+        with open(path, "rb") as bundle_file:
+            self.mtime_ns = os.fstat(bundle_file.fileno()).st_mtime_ns
+            self.buffer = mmap.mmap(bundle_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, index_length = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            self.buffer.close()
+            raise ValueError(f"Not a version {VERSION} asset bundle: {path}")
+        payload = HEADER.size + index_length
+        index = json.loads(self.buffer[HEADER.size : payload])
+        self.entries = {
+            name: BundleEntry(offset + payload, length, extension)
+            for name, (offset, length, extension) in index.items()
+        }
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def names(self, prefix: str = "") -> list[str]:
+        """
+        List the assets in the bundle.
+
+        Parameters
+        ----------
+        prefix : str, optional
+            Only list the names starting with it, e.g. "backgrounds/",
+            by default every asset.
+
+        Returns
+        -------
+        list[str]
+            The names of the assets, sorted.
+        """
+        return sorted(name for name in self.entries if name.startswith(prefix))
+
+    def read(self, name: str) -> memoryview:
+        """
+        Get the contents of an asset, without copying it.
+
+        Parameters
+        ----------
+        name : str
+            The name of the asset, its path relative to the packed folder.
+
+        Returns
+        -------
+        memoryview
+            The bytes of the asset, valid until the bundle is closed.
+
+        Raises
+        ------
+        KeyError
+            If the asset is not in the bundle.
+        """
+        entry = self.entries[name]
+        return memoryview(self.buffer)[entry.offset : entry.offset + entry.length]
+
+    def open(self, name: str) -> BundleFile:
+        """
+        Open an asset as a file, for loaders reading from file objects.
+        The file reads from the memory map, without copying the asset first.
+
+        Parameters
+        ----------
+        name : str
+            The name of the asset.
+
+        Returns
+        -------
+        BundleFile
+            The asset, valid until the bundle is closed.
+        """
+        return BundleFile(self.read(name))
+
+    def version(self, name: str) -> str:
+        """
+        Identify the contents of an asset, for keying caches on it.
+
+        Parameters
+        ----------
+        name : str
+            The name of the asset.
+
+        Returns
+        -------
+        str
+            A string changing whenever the asset might have changed.
+        """
+        entry = self.entries[name]
+        return f"{self.path}|{self.mtime_ns}|{entry.offset}|{entry.length}"
+
+    def close(self):
+        """Unmap the bundle."""
+        self.buffer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack the assets into one bundle.")
+    parser.add_argument("--source", default="assets", help="the folder to pack")
+    parser.add_argument(
+        "--output", default="assets.bundle", help="the bundle file to write"
+    )
+    args = parser.parse_args()
+    count = pack(args.source, args.output)
+    print(f"Packed {count} assets into {args.output}")
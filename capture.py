@@ -0,0 +1,276 @@
+"""
+Asynchronous screenshots and frame capture.
+
+The game thread only copies the pixels of the screen, the images are encoded
+and written on a worker thread. Continuous captures stream frames through a
+bounded queue, to a numbered PNG sequence or an animated GIF, and drop frames
+rather than stalling the game when the encoder falls behind.
+
+PNG files are compressed with zlib, which releases the GIL, unlike
+pygame.image.save, so the encoding doesn't hold up the game thread.
+Writing GIFs needs Pillow, without it captures fall back to PNG sequences.
+A file that can't be written is logged and skipped, the worker keeps going.
+"""
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+import pygame
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# How long the game waits for room in the queue before an item is given up
+PUT_TIMEOUT_S = 0.5
+
+
+def encode_png(data: bytes, size: tuple[int, int], level: int = 3) -> bytes:
+    """
+    Encode RGB pixels as a PNG image.
+
+    Parameters
+    ----------
+    data : bytes
+        The pixels, 3 bytes per pixel, row by row.
+    size : tuple[int, int]
+        The width and height of the image.
+    level : int, optional
+        The zlib compression level, by default 3. Higher levels barely shrink
+        the files of the game screens, but take several times longer.
+
+    Returns
+    -------
+    bytes
+        The PNG file.
+    """
+    width, height = size
+    rows = np.frombuffer(data, dtype=np.uint8).reshape(height, width * 3)
+    # Filter every row with the "up" filter, the difference to the row above it
+    filtered = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    filtered[:, 0] = 2
+    filtered[0, 1:] = rows[0]
+    np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+
+    def chunk(kind: bytes, body: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(body))
+            + kind
+            + body
+            + struct.pack(">I", zlib.crc32(kind + body))
+        )
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"".join(
+        (
+            b"\x89PNG\r\n\x1a\n",
+            chunk(b"IHDR", header),
+            chunk(b"IDAT", zlib.compress(filtered.tobytes(), level)),
+            chunk(b"IEND", b""),
+        )
+    )
+
+
+def write_png(path: str, data: bytes, size: tuple[int, int]):
+    """
+    Write RGB pixels to a PNG file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+    data : bytes
+        The pixels, 3 bytes per pixel, row by row.
+    size : tuple[int, int]
+        The width and height of the image.
+    """
+    with open(path, "wb") as png_file:
+        png_file.write(encode_png(data, size))
+
+
+class CaptureWriter:
+    """
+    Encodes and writes screenshots and captured frames on a worker thread.
+    """
+
+    def __init__(
+        self, max_pending: int = 8, capture_fps: int = 15, max_gif_frames: int = 900
+    ):
+        """
+        Initialize the writer and start the worker thread.
+
+        Parameters
+        ----------
+        max_pending : int, optional
+            The number of captured frames waiting for the encoder,
+            by default 8. Further frames are dropped until it catches up.
+        capture_fps : int, optional
+            The frame rate of continuous captures, by default 15
+        max_gif_frames : int, optional
+            The number of frames kept in memory for a GIF, by default 900.
+            Later frames of a longer capture are dropped.
+        """
+        self.capture_interval = 1 / capture_fps
+        self.max_gif_frames = max_gif_frames
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.path = None
+        self.last_capture = None
+        self.dropped = 0
+        self.failed = 0
+        self.worker = threading.Thread(
+            target=self._run, name="capture-writer", daemon=True
+        )
+        self.worker.start()
+
+    @property
+    def recording(self) -> bool:
+        """Whether a continuous capture is running."""
+        return self.path is not None
+
+    def screenshot(self, surface: pygame.SurfaceType, path: str):
+        """
+        Save a screenshot, the file is written in the background.
+
+        Parameters
+        ----------
+        surface : pygame.SurfaceType
+            The surface to save, usually the screen.
+        path : str
+            The path of the PNG file.
+        """
+        data = pygame.image.tobytes(surface, "RGB")
+        # Wait a little for room in the queue, but never on a dead worker
+        self._put(("screenshot", path, data, surface.get_size()))
+
+    def start(self, path: str) -> str:
+        """
+        Start a continuous capture.
+
+        Parameters
+        ----------
+        path : str
+            The .gif file to write, or the folder of the numbered PNG files.
+
+        Returns
+        -------
+        str
+            The path actually written to, a folder if a GIF can't be written.
+        """
+        if self.recording:
+            self.stop()
+        if path.lower().endswith(".gif") and Image is None:
+            print("Pillow is not installed, capturing PNG files instead of a GIF")
+            path = os.path.splitext(path)[0]
+        self.path = path
+        self.last_capture = None
+        self._put(("start", path))
+        return path
+
+    def stop(self):
+        """Finish the continuous capture, the file is completed in the background."""
+        if self.recording:
+            self.path = None
+            self._put(("stop",))
+
+    def frame(self, surface: pygame.SurfaceType):
+        """
+        Capture a frame of a continuous capture, called every frame.
+        Does nothing if no capture is running or it isn't time for the next frame yet.
+
+        Parameters
+        ----------
+        surface : pygame.SurfaceType
+            The surface to capture, usually the screen.
+        """
+        if not self.recording:
+            return
+        now = time.monotonic()
+        if (
+            self.last_capture is not None
+            and now - self.last_capture < self.capture_interval
+        ):
+            return
+        self.last_capture = now
+        try:
+            self.queue.put_nowait(
+                ("frame", now, pygame.image.tobytes(surface, "RGB"), surface.get_size())
+            )
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Finish the capture and the pending writes, stop the worker."""
+        if not self.worker.is_alive():
+            return
+        self.stop()
+        self.queue.put(None)
+        self.worker.join()
+
+    def _put(self, item: tuple):
+        """Queue an item for the worker, count it as failed if it can't be."""
+        if not self.worker.is_alive():
+            self.failed += 1
+            return
+        try:
+            self.queue.put(item, timeout=PUT_TIMEOUT_S)
+        except queue.Full:
+            self.failed += 1
+
+    def _run(self):
+        """Encode and write the queued images, runs on the worker thread."""
+        path = None
+        frames = []
+        count = 0
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            try:
+                match item:
+                    case ("screenshot", shot_path, data, size):
+                        os.makedirs(os.path.dirname(shot_path) or ".", exist_ok=True)
+                        write_png(shot_path, data, size)
+                    case ("start", path):
+                        frames = []
+                        count = 0
+                        if not path.lower().endswith(".gif"):
+                            os.makedirs(path, exist_ok=True)
+                    case ("frame", timestamp, data, size):
+                        if path.lower().endswith(".gif"):
+                            if len(frames) < self.max_gif_frames:
+                                image = Image.frombytes("RGB", size, data)
+                                frames.append((timestamp, image.quantize(colors=256)))
+                            else:
+                                self.dropped += 1
+                        else:
+                            count += 1
+                            write_png(
+                                os.path.join(path, f"frame_{count:05d}.png"), data, size
+                            )
+                    case ("stop",):
+                        gif_frames, frames = frames, []
+                        if gif_frames:
+                            self._save_gif(path, gif_frames)
+            except (OSError, zlib.error):
+                # A full disk or a failed compression loses this file, not the writer
+                self.failed += 1
+                logging.exception("Capture failed: %s", item[0])
+
+    def _save_gif(self, path: str, frames: list):
+        """Write the captured frames to a GIF, timed as they were captured."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        timestamps = [timestamp for timestamp, _ in frames]
+        durations = [
+            round((later - earlier) * 1000)
+            for earlier, later in zip(timestamps, timestamps[1:])
+        ]
+        durations.append(round(self.capture_interval * 1000))
+        images = [image for _, image in frames]
+        images[0].save(
+            path, save_all=True, append_images=images[1:], duration=durations, loop=0
+        )
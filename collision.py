@@ -0,0 +1,270 @@
+"""
+Broadphase collision detection.
+
+A uniform-grid spatial hash over the entities of an EntityStore, so checking a
+set of boxes against a swarm scales with the number of entities close to each
+box rather than with the size of the whole swarm.
+"""
+import numpy as np
+from entities import SCALAR_MAX_SLOTS, EntityStore
+
+# Offset to keep cell coordinates positive when packing them into one key,
+# entities may be slightly off screen.
+_CELL_OFFSET = 1 << 15
+# Up to this many pairs of slots, brute_force_pairs checks them in plain Python
+SCALAR_MAX_PAIRS = SCALAR_MAX_SLOTS**2
+# The result of a check without hits, shared and read-only
+_NO_INDICES = np.empty(0, dtype=np.int64)
+_NO_INDICES.flags.writeable = False
+
+
+class SpatialHash:
+    """
+    Uniform-grid spatial hash, rebuilt from an EntityStore every tick.
+    """
+
+    def __init__(self, cell_size: int = 128):
+        """
+        Initialize the spatial hash.
+
+        Parameters
+        ----------
+        cell_size : int, optional
+            The width and height of a grid cell in pixels, by default 128.
+            Works best when it is about the size of the largest entity.
+        """
+        self.cell_size = cell_size
+        self.keys = np.empty(0, dtype=np.int64)
+        self.items = np.empty(0, dtype=np.int64)
+        self.store = None
+
+    def _cell_ranges(self, x, y, width, height):
+        """Get the first and last cell coordinates covered by boxes."""
+        size = self.cell_size
+        x0 = np.floor_divide(x, size).astype(np.int64) + _CELL_OFFSET
+        y0 = np.floor_divide(y, size).astype(np.int64) + _CELL_OFFSET
+        x1 = np.floor_divide(x + width, size).astype(np.int64) + _CELL_OFFSET
+        y1 = np.floor_divide(y + height, size).astype(np.int64) + _CELL_OFFSET
+        return x0, y0, x1, y1
+
+    @staticmethod
+    def _expand(owners, x0, y0, x1, y1):
+        """
+        List every (owner, cell key) pair covered by the cell ranges.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The owner and the cell key of each pair.
+        """
+        span_x = x1 - x0 + 1
+        span_y = y1 - y0 + 1
+        counts = span_x * span_y
+        total = int(counts.sum())
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        offset = np.arange(total) - first
+        owner = np.repeat(owners, counts)
+        width = np.repeat(span_x, counts)
+        cell_x = np.repeat(x0, counts) + offset % width
+        cell_y = np.repeat(y0, counts) + offset // width
+        return owner, (cell_x << 16) | cell_y
+
+    def build(self, store: EntityStore):
+        """
+        Insert the active entities of a store into the grid.
+
+        Parameters
+        ----------
+        store : EntityStore
+            The entities to index.
+        """
+        self.store = store
+        indices = store.indices()
+        ranges = self._cell_ranges(
+            store.x[indices],
+            store.y[indices],
+            store.width[indices],
+            store.height[indices],
+        )
+        items, keys = self._expand(indices, *ranges)
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.items = items[order]
+
+    def query_pairs(self, other: EntityStore) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the overlapping pairs between the active entities of another store
+        and the indexed entities.
+
+        Parameters
+        ----------
+        other : EntityStore
+            The entities to check against the grid.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            The indices into the other store and the matching indices into the
+            indexed store, sorted by the index into the other store, then the
+            indexed store.
+        """
+        empty = np.empty(0, dtype=np.int64)
+        queries = other.indices()
+        if len(queries) == 0 or len(self.keys) == 0:
+            return empty, empty
+        ranges = self._cell_ranges(
+            other.x[queries],
+            other.y[queries],
+            other.width[queries],
+            other.height[queries],
+        )
+        owner, keys = self._expand(queries, *ranges)
+        start = np.searchsorted(self.keys, keys, side="left")
+        stop = np.searchsorted(self.keys, keys, side="right")
+        counts = stop - start
+        total = int(counts.sum())
+        if total == 0:
+            return empty, empty
+        first = np.repeat(np.cumsum(counts) - counts, counts)
+        slots = np.repeat(start, counts) + np.arange(total) - first
+        cells = np.repeat(keys, counts)
+        candidates_a = np.repeat(owner, counts)
+        candidates_b = self.items[slots]
+
+        # Narrowphase: exact box overlap, with pygame.Rect.colliderect semantics
+        store = self.store
+        a_x, a_y = other.x[candidates_a], other.y[candidates_a]
+        b_x, b_y = store.x[candidates_b], store.y[candidates_b]
+        hits = (
+            (a_x < b_x + store.width[candidates_b])
+            & (b_x < a_x + other.width[candidates_a])
+            & (a_y < b_y + store.height[candidates_b])
+            & (b_y < a_y + other.height[candidates_a])
+        )
+
+        # Boxes sharing more than one cell meet in each of them, only keep the
+        # meeting in the cell holding the top left corner of their intersection
+        corner_x, corner_y, _, _ = self._cell_ranges(
+            np.maximum(a_x, b_x), np.maximum(a_y, b_y), 0, 0
+        )
+        hits &= cells == ((corner_x << 16) | corner_y)
+        candidates_a, candidates_b = candidates_a[hits], candidates_b[hits]
+        order = np.lexsort((candidates_b, candidates_a))
+        return candidates_a[order], candidates_b[order]
+
+    def query(self, box: tuple[float, float, float, float]) -> np.ndarray:
+        """
+        Find the indexed entities overlapping a box.
+
+        Parameters
+        ----------
+        box : tuple[float, float, float, float]
+            The x, y, width and height of the box.
+
+        Returns
+        -------
+        np.ndarray
+            The indices of the overlapping entities, in ascending order.
+        """
+        x, y, width, height = box
+        ranges = self._cell_ranges(
+            np.array([x]), np.array([y]), np.array([width]), np.array([height])
+        )
+        _, keys = self._expand(np.zeros(1, dtype=np.int64), *ranges)
+        candidates = np.unique(
+            np.concatenate(
+                [
+                    self.items[start:stop]
+                    for start, stop in zip(
+                        np.searchsorted(self.keys, keys, side="left"),
+                        np.searchsorted(self.keys, keys, side="right"),
+                    )
+                ]
+            )
+        )
+        return candidates[self.store.overlaps(box)[candidates]]
+
+
+def brute_force_pairs(
+    other: EntityStore, store: EntityStore
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Find the overlapping pairs between two stores by checking every pair.
+    Reference for SpatialHash.query_pairs, scales with the product of the store sizes.
+
+    Parameters
+    ----------
+    other : EntityStore
+        The first store.
+    store : EntityStore
+        The second store.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The indices into the first store and the matching indices into the second.
+    """
+    if other.capacity * store.capacity <= SCALAR_MAX_PAIRS:
+        return _scalar_pairs(other, store)
+    empty = np.empty(0, dtype=np.int64)
+    queries, targets = other.indices(), store.indices()
+    if len(queries) == 0 or len(targets) == 0:
+        return empty, empty
+    a_x, a_y = other.x[queries, None], other.y[queries, None]
+    b_x, b_y = store.x[targets], store.y[targets]
+    hits = (
+        (a_x < b_x + store.width[targets])
+        & (b_x < a_x + other.width[queries, None])
+        & (a_y < b_y + store.height[targets])
+        & (b_y < a_y + other.height[queries, None])
+    )
+    rows, cols = np.nonzero(hits)
+    return queries[rows], targets[cols]
+
+
+def _scalar_pairs(
+    other: EntityStore, store: EntityStore
+) -> tuple[np.ndarray, np.ndarray]:
+    """Check every pair in plain Python, faster than NumPy for a few slots."""
+    queries = other.active.tolist()
+    # Most ticks have nothing in flight or no hit, skip building the arrays then
+    if True not in queries:
+        return _NO_INDICES, _NO_INDICES
+    targets = [
+        (index, x, y, width, height)
+        for index, (active, x, y, width, height) in enumerate(
+            zip(
+                store.active.tolist(),
+                store.x.tolist(),
+                store.y.tolist(),
+                store.width.tolist(),
+                store.height.tolist(),
+            )
+        )
+        if active
+    ]
+    rows, cols = [], []
+    if targets:
+        for query, (active, x, y, width, height) in enumerate(
+            zip(
+                queries,
+                other.x.tolist(),
+                other.y.tolist(),
+                other.width.tolist(),
+                other.height.tolist(),
+            )
+        ):
+            if not active:
+                continue
+            for target, target_x, target_y, target_width, target_height in targets:
+                if (
+                    x < target_x + target_width
+                    and target_x < x + width
+                    and y < target_y + target_height
+                    and target_y < y + height
+                ):
+                    rows.append(query)
+                    cols.append(target)
+    if not rows:
+        return _NO_INDICES, _NO_INDICES
+    return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
@@ -0,0 +1,189 @@
+"""
+The game config, read from config.yaml.
+
+Kept apart from the asset helpers in utils, so the headless tools can read the
+config without importing pygame.
+"""
+import os
+from collections import namedtuple
+from dataclasses import dataclass, field
+from typing import NamedTuple
+import yaml
+from simulation import DIFFICULTIES, load_difficulties
+
+ConfigPaths = namedtuple(
+    "paths",
+    "assets sprites backgrounds ui fonts main_font sounds screenshots asset_cache "
+    "bundle replays telemetry leaderboard",
+)
+ConfigPaths.assets = os.path.join(os.getcwd(), "assets")
+ConfigPaths.sprites = os.path.join(os.getcwd(), "assets", "sprites")
+ConfigPaths.backgrounds = os.path.join(os.getcwd(), "assets", "backgrounds")
+ConfigPaths.ui = os.path.join(os.getcwd(), "assets", "ui")
+ConfigPaths.fonts = os.path.join(os.getcwd(), "assets", "fonts")
+ConfigPaths.main_font = os.path.join(
+    os.getcwd(), "assets", "fonts", "C64_Pro_Mono-STYLE.ttf"
+)
+ConfigPaths.sounds = os.path.join(os.getcwd(), "assets", "sounds")
+ConfigPaths.screenshots = os.path.join(os.getcwd(), "screenshots")
+ConfigPaths.asset_cache = os.path.join(os.getcwd(), ".asset_cache")
+ConfigPaths.bundle = os.path.join(os.getcwd(), "assets.bundle")
+ConfigPaths.replays = os.path.join(os.getcwd(), "replays")
+ConfigPaths.telemetry = os.path.join(os.getcwd(), "telemetry.jsonl")
+ConfigPaths.leaderboard = os.path.join(os.getcwd(), "leaderboard.db")
+
+
+@dataclass(frozen=True)
+class Config:
+    """
+    The game config class.
+    """
+
+    resolution: tuple[int, int] = 800, 800
+    logical_resolution: tuple[int, int] = 800, 800
+    fps: int = 60
+    max_level: int = 10
+    swarm_size: int = 1
+    max_shurikens: int = 3
+    background_cache_size: int = 3
+    record_replays: bool = False
+    telemetry: bool = False
+    telemetry_interval_ms: int = 1000
+    render_scale: float = 1.0
+    smooth_upscale: bool = True
+    adaptive_upscale: bool = False
+    frame_pacing: str = "precise"
+    menu_fps: int = 30
+    difficulties: dict = field(default_factory=lambda: DIFFICULTIES)
+    window_title: str = "Ninja vs. Bakugan"
+    paths: NamedTuple = ConfigPaths
+    font_size: int = 32
+
+    @property
+    def render_resolution(self) -> tuple[int, int]:
+        """The resolution the game is drawn in, before it is scaled to the window."""
+        return (
+            max(round(self.resolution[0] * self.render_scale), 1),
+            max(round(self.resolution[1] * self.render_scale), 1),
+        )
+
+    @property
+    def view_scale(self) -> tuple[float, float]:
+        """The size of a pixel of the playing field on the canvas, per axis."""
+        width, height = self.render_resolution
+        return (
+            width / self.logical_resolution[0],
+            height / self.logical_resolution[1],
+        )
+
+    @property
+    def ui_font(self) -> "pygame.font.FontType":
+        """The font of the game UI, loaded on first use."""
+        # Imported here, the headless tools read the config without pygame
+        from utils import get_font
+
+        return get_font(self.paths.main_font, self.font_size)
+
+    @classmethod
+    def load(cls, path: str = "config.yaml", **overrides) -> "Config":
+        """
+        Load the config from the config file, if it exists.
+
+        Parameters
+        ----------
+        path : str, optional
+            The path to the config file, by default config.yaml in the working
+            directory.
+        **overrides
+            Values to use instead of the defaults, e.g. window_title.
+
+        Returns
+        -------
+        Config
+            The game config.
+        """
+        values = {}
+        section = None
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf8") as config_file:
+                config = yaml.safe_load(config_file)
+            values["resolution"] = (
+                config["resolution"]["horizontal"],
+                config["resolution"]["vertical"],
+            )
+            if "logical_resolution" in config:
+                values["logical_resolution"] = (
+                    config["logical_resolution"]["horizontal"],
+                    config["logical_resolution"]["vertical"],
+                )
+            values["fps"] = config["fps"]
+            values["max_level"] = config["max_level"]
+            for key in (
+                "swarm_size",
+                "max_shurikens",
+                "background_cache_size",
+                "record_replays",
+                "telemetry",
+                "telemetry_interval_ms",
+                "render_scale",
+                "smooth_upscale",
+                "adaptive_upscale",
+                "frame_pacing",
+                "menu_fps",
+            ):
+                if key in config:
+                    values[key] = config[key]
+            section = config.get("difficulties")
+        values.update(overrides)
+        # Check the rules the way the game plays them, with the overrides applied
+        if "difficulties" not in overrides:
+            values["difficulties"] = load_difficulties(
+                section,
+                values.get("max_level", cls.max_level),
+                swarm_size=values.get("swarm_size", cls.swarm_size),
+                max_shurikens=values.get("max_shurikens", cls.max_shurikens),
+            )
+        return cls(**values)
+
+
+class LazyConfig:
+    """
+    The game config, read from the config file when it is first used.
+    Importing the modules of the game doesn't touch the disk this way.
+    """
+
+    def __init__(self, path: str = "config.yaml", **overrides):
+        """
+        Initialize the lazy config.
+
+        Parameters
+        ----------
+        path : str, optional
+            The path to the config file, by default config.yaml in the working
+            directory.
+        **overrides
+            Values to use instead of the ones in the config file.
+        """
+        self._path = path
+        self._overrides = overrides
+        self._config = None
+
+    def load(self) -> Config:
+        """
+        Get the config, load it on first use.
+
+        Returns
+        -------
+        Config
+            The game config.
+        """
+        if self._config is None:
+            self._config = Config.load(self._path, **self._overrides)
+        return self._config
+
+    def __getattr__(self, name: str):
+        return getattr(self.load(), name)
+
+
+# Set the game config
+CONFIG = LazyConfig(window_title="Ninja vs. Bakugan")
@@ -0,0 +1,538 @@
+"""
+The game entities.
+
+The state of the entities lives in an EntityStore, which keeps the positions,
+speeds, HP and sizes of all entities of a kind in contiguous NumPy arrays, so
+they can be updated with vectorized batch operations. The entity classes are
+thin views over one slot of a store.
+"""
+from typing import TYPE_CHECKING
+import numpy as np
+
+if TYPE_CHECKING:
+    import pygame
+
+# Height of the UI bar at the top of the screen, entities can't enter it.
+TOP_MARGIN = 50
+# Stores with at most this many slots are updated in plain Python, for a handful
+# of values that is several times faster than the overhead of the NumPy calls
+SCALAR_MAX_SLOTS = 8
+
+
+class EntityStore:
+    """
+    Array-backed storage for entities of the same kind.
+    """
+
+    def __init__(self, capacity: int = 1):
+        """
+        Initialize the store.
+
+        Parameters
+        ----------
+        capacity : int, optional
+            The initial number of slots, by default 1. The store grows when full.
+        """
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.speed = np.zeros(capacity)
+        self.hp = np.zeros(capacity)
+        self.width = np.zeros(capacity)
+        self.height = np.zeros(capacity)
+        self.active = np.zeros(capacity, dtype=bool)
+
+    @property
+    def capacity(self) -> int:
+        """The number of slots in the store."""
+        return len(self.active)
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.active))
+
+    def add(
+        self, x: float, y: float, speed: float, hp: float, size: tuple[int, int]
+    ) -> int:
+        """
+        Add an entity to a free slot of the store.
+
+        Parameters
+        ----------
+        x : float
+            The x position of the entity.
+        y : float
+            The y position of the entity.
+        speed : float
+            The speed of the entity.
+        hp : float
+            The health of the entity.
+        size : tuple[int, int]
+            The width and height of the entity.
+
+        Returns
+        -------
+        int
+            The index of the slot the entity was stored in.
+        """
+        free = np.flatnonzero(~self.active)
+        if len(free) == 0:
+            self._grow()
+            free = np.flatnonzero(~self.active)
+        index = int(free[0])
+        self.x[index] = x
+        self.y[index] = y
+        self.speed[index] = speed
+        self.hp[index] = hp
+        self.width[index], self.height[index] = size
+        self.active[index] = True
+        return index
+
+    def remove(self, index: int):
+        """
+        Free the slot of an entity.
+
+        Parameters
+        ----------
+        index : int
+            The index of the slot to free.
+        """
+        self.active[index] = False
+
+    def indices(self) -> np.ndarray:
+        """
+        Get the indices of the occupied slots.
+
+        Returns
+        -------
+        np.ndarray
+            The indices of the occupied slots, in ascending order.
+        """
+        return self.active.nonzero()[0]
+
+    def overlaps(self, box: tuple[float, float, float, float]) -> np.ndarray:
+        """
+        Check which entities overlap a box, with pygame.Rect.colliderect semantics.
+
+        Parameters
+        ----------
+        box : tuple[float, float, float, float]
+            The x, y, width and height of the box to check against.
+
+        Returns
+        -------
+        np.ndarray
+            Boolean mask of the active entities overlapping the box.
+        """
+        x, y, width, height = box
+        return (
+            self.active
+            & (self.x < x + width)
+            & (x < self.x + self.width)
+            & (self.y < y + height)
+            & (y < self.y + self.height)
+        )
+
+    def overlapping(self, box: tuple[float, float, float, float]) -> np.ndarray:
+        """
+        Get the indices of the entities overlapping a box.
+
+        Parameters
+        ----------
+        box : tuple[float, float, float, float]
+            The x, y, width and height of the box to check against.
+
+        Returns
+        -------
+        np.ndarray
+            The indices of the active entities overlapping the box, ascending.
+        """
+        if self.capacity > SCALAR_MAX_SLOTS:
+            return self.overlaps(box).nonzero()[0]
+        x, y, width, height = (float(value) for value in box)
+        return np.array(
+            [
+                index
+                for index, (active, left, top, other_width, other_height) in enumerate(
+                    zip(
+                        self.active.tolist(),
+                        self.x.tolist(),
+                        self.y.tolist(),
+                        self.width.tolist(),
+                        self.height.tolist(),
+                    )
+                )
+                if active
+                and left < x + width
+                and x < left + other_width
+                and top < y + height
+                and y < top + other_height
+            ],
+            dtype=np.int64,
+        )
+
+    def box(self, index: int) -> tuple[float, float, float, float]:
+        """
+        Get the exact position and size of an entity.
+
+        Parameters
+        ----------
+        index : int
+            The index of the entity.
+
+        Returns
+        -------
+        tuple[float, float, float, float]
+            The x, y, width and height of the entity.
+        """
+        return (self.x[index], self.y[index], self.width[index], self.height[index])
+
+    def _grow(self):
+        """Double the number of slots."""
+        for name in ("x", "y", "speed", "hp", "width", "height", "active"):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+
+
+class ProjectilePool(EntityStore):
+    """
+    Fixed-capacity EntityStore with a stack of free slots.
+    Spawning and despawning are O(1) and never allocate, the pool doesn't grow.
+    """
+
+    def __init__(self, capacity: int):
+        """
+        Initialize the pool.
+
+        Parameters
+        ----------
+        capacity : int
+            The maximum number of projectiles in flight.
+        """
+        super().__init__(capacity)
+        # Pop from the end, so the lowest free slot is used first
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self) -> int:
+        return self.capacity - len(self.free)
+
+    def spawn(
+        self, x: float, y: float, speed: float, hp: float, size: tuple[int, int]
+    ) -> int:
+        """
+        Put a projectile in a free slot.
+
+        Parameters
+        ----------
+        x : float
+            The x position of the projectile.
+        y : float
+            The y position of the projectile.
+        speed : float
+            The speed of the projectile.
+        hp : float
+            The health of the projectile.
+        size : tuple[int, int]
+            The width and height of the projectile.
+
+        Returns
+        -------
+        int
+            The index of the slot, or None if the pool is full.
+        """
+        if not self.free:
+            return None
+        index = self.free.pop()
+        self.x[index] = x
+        self.y[index] = y
+        self.speed[index] = speed
+        self.hp[index] = hp
+        self.width[index], self.height[index] = size
+        self.active[index] = True
+        return index
+
+    add = spawn
+
+    def despawn(self, index: int):
+        """
+        Free the slot of a projectile.
+
+        Parameters
+        ----------
+        index : int
+            The index of the slot to free.
+        """
+        if self.active[index]:
+            self.active[index] = False
+            self.free.append(int(index))
+
+    remove = despawn
+
+    def despawn_where(self, mask: np.ndarray):
+        """
+        Free the slots of all projectiles selected by a mask.
+
+        Parameters
+        ----------
+        mask : np.ndarray
+            Boolean mask over the slots of the pool.
+        """
+        indices = (mask & self.active).nonzero()[0]
+        if len(indices) > 0:
+            self.active[indices] = False
+            self.free.extend(indices.tolist())
+
+
+class EntityView:
+    """
+    Base class of the entities, a view over one slot of an EntityStore.
+    The simulation doesn't need pygame, it is only imported for the rects.
+    """
+
+    def __init__(
+        self,
+        x: float,
+        y: float,
+        speed: float,
+        hp: float,
+        image: "pygame.SurfaceType" = None,
+        size: tuple[int, int] = (96, 96),
+        store: EntityStore = None,
+    ):
+        """
+        Initialize the entity.
+
+        Parameters
+        ----------
+        x : float
+            The x position of the entity.
+        y : float
+            The y position of the entity.
+        speed : float
+            The speed of the entity.
+        hp : float
+            The health of the entity.
+        image : pygame.SurfaceType, optional
+            The image of the entity, by default None (headless).
+        size : tuple[int, int], optional
+            The size of the entity if no image is given, by default (96, 96)
+        store : EntityStore, optional
+            The store to keep the entity in, by default a new store of its own.
+        """
+        self.image = image
+        if image is not None:
+            size = image.get_size()
+        self.store = store if store is not None else EntityStore()
+        self.index = self.store.add(x, y, speed, hp, size)
+
+    @property
+    def x(self) -> float:
+        """The x position of the entity."""
+        return self.store.x[self.index]
+
+    @x.setter
+    def x(self, value: float):
+        self.store.x[self.index] = value
+
+    @property
+    def y(self) -> float:
+        """The y position of the entity."""
+        return self.store.y[self.index]
+
+    @y.setter
+    def y(self, value: float):
+        self.store.y[self.index] = value
+
+    @property
+    def speed(self) -> float:
+        """The speed of the entity."""
+        return self.store.speed[self.index]
+
+    @speed.setter
+    def speed(self, value: float):
+        self.store.speed[self.index] = value
+
+    @property
+    def hp(self) -> float:
+        """The health of the entity."""
+        return self.store.hp[self.index]
+
+    @hp.setter
+    def hp(self, value: float):
+        self.store.hp[self.index] = value
+
+    @property
+    def box(self) -> tuple[float, float, float, float]:
+        """The exact position and size of the entity."""
+        return self.store.box(self.index)
+
+    @property
+    def rect(self) -> "pygame.Rect":
+        """
+        A snapshot of the bounding rectangle of the entity.
+        Changing the returned rect doesn't move the entity, assign it back instead.
+        """
+        import pygame
+
+        store, index = self.store, self.index
+        return pygame.Rect(
+            store.x[index], store.y[index], store.width[index], store.height[index]
+        )
+
+    @rect.setter
+    def rect(self, value: "pygame.Rect"):
+        self.store.x[self.index] = value.x
+        self.store.y[self.index] = value.y
+
+
+class Player(EntityView):
+    """
+    The player class.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.facing = "front"
+
+    def update_keyboard(self, key_list: list, _dt: float, bounds: tuple[int, int]):
+        """
+        Update the player based on keyboard input.
+
+        Parameters
+        ----------
+        key_list : list
+            The directions that are pressed, in up, down, left, right order.
+        _dt : float
+            The time step.
+        bounds : tuple[int, int]
+            The width and height of the playing field.
+        """
+        up, down, left, right = key_list
+        step = self.speed * _dt
+        if up:
+            self.y -= step
+            self.facing = "front"
+        if down:
+            self.y += step
+            self.facing = "front"
+        if left:
+            self.x -= step
+            self.facing = "left"
+        if right:
+            self.x += step
+            self.facing = "right"
+        clamp(self.store, bounds)
+
+    def update_mouse(
+        self, mouse_location: tuple[int, int], _dt: float, bounds: tuple[int, int]
+    ):
+        """
+        Update the player based on mouse input.
+
+        Parameters
+        ----------
+        mouse_location : tuple[int, int]
+            The location of the mouse.
+        _dt : float
+            The time step.
+        bounds : tuple[int, int]
+            The width and height of the playing field.
+        """
+        if mouse_location[0] < self.x:
+            self.facing = "left"
+        elif mouse_location[0] > self.x:
+            self.facing = "right"
+        else:
+            self.facing = "front"
+
+        # Update the player's position based on the mouse location.
+        self.x, self.y = mouse_location
+        clamp(self.store, bounds)
+
+
+class Enemy(EntityView):
+    """
+    The enemy class.
+    """
+
+
+def clamp(store: EntityStore, bounds: tuple[int, int]):
+    """
+    Move all entities of a store back within the bounds of the playing field.
+
+    Parameters
+    ----------
+    store : EntityStore
+        The entities to clamp.
+    bounds : tuple[int, int]
+        The width and height of the playing field.
+    """
+    width, height = bounds
+    if store.capacity <= SCALAR_MAX_SLOTS:
+        for index, (x, y, entity_width, entity_height) in enumerate(
+            zip(
+                store.x.tolist(),
+                store.y.tolist(),
+                store.width.tolist(),
+                store.height.tolist(),
+            )
+        ):
+            store.x[index] = min(max(x, 0), width - entity_width)
+            store.y[index] = min(max(y, TOP_MARGIN), height - entity_height)
+        return
+    # The ufuncs behave like np.clip, without its overhead on small stores
+    np.minimum(np.maximum(store.x, 0, out=store.x), width - store.width, out=store.x)
+    np.minimum(
+        np.maximum(store.y, TOP_MARGIN, out=store.y),
+        height - store.height,
+        out=store.y,
+    )
+
+
+def move_enemies(store: EntityStore, _dt: float, bounds: tuple[int, int]):
+    """
+    Keep the enemies within the playing field vertically and move them to the left.
+
+    Parameters
+    ----------
+    store : EntityStore
+        The enemies to move.
+    _dt : float
+        The time step.
+    bounds : tuple[int, int]
+        The width and height of the playing field.
+    """
+    if store.capacity <= SCALAR_MAX_SLOTS:
+        for index, (x, y, speed, height) in enumerate(
+            zip(
+                store.x.tolist(),
+                store.y.tolist(),
+                store.speed.tolist(),
+                store.height.tolist(),
+            )
+        ):
+            store.y[index] = min(max(y, TOP_MARGIN), bounds[1] - height)
+            store.x[index] = x - speed * _dt
+        return
+    np.minimum(
+        np.maximum(store.y, TOP_MARGIN, out=store.y),
+        bounds[1] - store.height,
+        out=store.y,
+    )
+    store.x -= store.speed * _dt
+
+
+def move_projectiles(store: EntityStore, _dt: float):
+    """
+    Move all projectiles to the right.
+
+    Parameters
+    ----------
+    store : EntityStore
+        The projectiles to move.
+    _dt : float
+        The time step.
+    """
+    if store.capacity <= SCALAR_MAX_SLOTS:
+        for index, (x, speed) in enumerate(zip(store.x.tolist(), store.speed.tolist())):
+            store.x[index] = x + speed * _dt
+        return
+    store.x += store.speed * _dt
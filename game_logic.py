@@ -3,270 +3,204 @@ Game logic for the game.
 """
 import os
 import sys
-import random
 from datetime import datetime
 import pygame
 from views.game_ui import GameUI
 from views.menu import menu_loop
 from views.win import win
 from views.lose import lose
-from utils import (
-    COLORS,
-    CONFIG,
-    WINDOW_HEIGHT,
-    WINDOW_WIDTH,
-    load_sprite,
-    load_backgrounds,
-    detect_collision,
-    check_bounds,
-    screen_init,
-)
-
-
-class Player(pygame.sprite.Sprite):
+from views.renderer import DirtyRenderer
+from profiler import FrameProfiler
+from simulation import TICK_DT, FixedTimestep, Inputs, Rules, World
+from replay import InputRecorder
+from app import APP
+from utils import CONFIG, load_sprite, load_sprite_variants
+
+
+def canvas_size(size: tuple[int, int]) -> tuple[int, int]:
     """
-    The player class.
+    Scale a size on the playing field to the canvas.
+
+    Parameters
+    ----------
+    size : tuple[int, int]
+        The width and height in logical pixels.
+
+    Returns
+    -------
+    tuple[int, int]
+        The width and height on the canvas, at least 1 pixel.
     """
+    scale_x, scale_y = CONFIG.view_scale
+    return max(round(size[0] * scale_x), 1), max(round(size[1] * scale_y), 1)
+
 
-    def __init__(self, x: int, y: int, speed: int, hp: int, image: pygame.SurfaceType):
-        """
-        Initialize the player.
-
-        Parameters
-        ----------
-        x : int
-            The x position of the player.
-        y : int
-            The y position of the player.
-        speed : int
-            The speed of the player.
-        hp : int
-            The health of the player.
-        image : pygame.SurfaceType
-            The image of the player.
-        """
-        super().__init__()
-        self.image = image
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
-        self.speed = speed
-        self.hp = hp
-
-    def update_keyboard(self, key_list: list, _dt: float):
-        """
-        Update the player based on keyboard input.
-
-        Parameters
-        ----------
-        key_list : list
-            The keys that are pressed.
-        """
-        if key_list[pygame.K_UP]:
-            self.rect.y -= self.speed * _dt
-            self.image = player_image
-        if key_list[pygame.K_DOWN]:
-            self.rect.y += self.speed * _dt
-            self.image = player_image
-        if key_list[pygame.K_LEFT]:
-            self.rect.x -= self.speed * _dt
-            self.image = player_side_image
-        if key_list[pygame.K_RIGHT]:
-            self.rect.x += self.speed * _dt
-            self.image = pygame.transform.flip(player_side_image, True, False)
-
-        # Check if the player's new location is within the bounds of the screen.
-        # Correct it if not.
-        if not check_bounds(self):
-            if self.rect.x < 0:
-                self.rect.x = 0
-            elif self.rect.x > WINDOW_WIDTH - self.rect.width:
-                self.rect.x = WINDOW_WIDTH - self.rect.width
-            if self.rect.y < 50:
-                self.rect.y = 50
-            elif self.rect.y > WINDOW_HEIGHT - self.rect.height:
-                self.rect.y = WINDOW_HEIGHT - self.rect.height
-
-    def update_mouse(self, mouse_location: tuple[int, int], _df: float):
-        """
-        Update the player based on mouse input.
-
-        Parameters
-        ----------
-        mouse_location : tuple[int, int]
-            The location of the mouse.
-        """
-        if mouse_location[0] < self.rect.x:
-            self.image = player_side_image
-        elif mouse_location[0] > self.rect.x:
-            self.image = pygame.transform.flip(player_side_image, True, False)
-        else:
-            self.image = player_image
-
-        # Update the player's position based on the mouse location.
-        self.rect.x = mouse_location[0]
-        self.rect.y = mouse_location[1]
-
-        # Check if the player's new location is within the bounds of the screen.
-        # Correct it if not.
-        if not check_bounds(self):
-            if self.rect.x < 0:
-                self.rect.x = 0
-            elif self.rect.x > WINDOW_WIDTH - self.rect.width:
-                self.rect.x = WINDOW_WIDTH - self.rect.width
-            if self.rect.y < 50:
-                self.rect.y = 50
-            elif self.rect.y > WINDOW_HEIGHT - self.rect.height:
-                self.rect.y = WINDOW_HEIGHT - self.rect.height
-
-    def draw(self, screen: pygame.SurfaceType):
-        """
-        Draw the player.
-
-        Parameters
-        ----------
-        screen : pygame.SurfaceType
-            The screen to draw on.
-        """
-        screen.blit(self.image, self.rect)
-
-
-class Enemy(pygame.sprite.Sprite):
+def load_images():
     """
-    The enemy class.
+    Load the images of the game into the module, the display has to be set up.
+    The sprites are scaled to the canvas, the hitboxes keep their logical size.
+    """
+    global player_images, enemy_image, background_images, shuriken_image
+    player_images = {
+        "front": load_sprite("ninja.png", canvas_size((96, 96))),
+        **load_sprite_variants("ninja_side.png", canvas_size((72, 96))),
+    }
+    enemy_image = load_sprite("enemy.png", canvas_size((96, 96)))
+    background_images = APP.backgrounds
+    shuriken_image = load_sprite("shuriken.png", canvas_size((32, 32)))
+
+
+def read_inputs(controls: str, scale: tuple[float, float] = (1, 1)) -> Inputs:
     """
+    Read the current state of the input devices.
+
+    Parameters
+    ----------
+    controls : str
+        The controls of the game.
+    scale : tuple[float, float], optional
+        The size of the playing field relative to the window, to convert the
+        mouse position to the coordinates of the world, by default (1, 1)
 
-    def __init__(self, x: int, y: int, speed: int, hp: int, image: pygame.SurfaceType):
-        """
-        Initialize the enemy.
-
-        Parameters
-        ----------
-        x : int
-            The x position of the enemy.
-        y : int
-            The y position of the enemy.
-        speed : int
-            The speed of the enemy.
-        hp : int
-            The health of the enemy.
-        image : pygame.SurfaceType
-            The image of the enemy.
-        """
-        super().__init__()
-        self.image = image
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
-        self.speed = speed
-        self.hp = hp
-
-    def update(self, _dt: float):
-        """
-        Update the enemy.
-        """
-        # Check if the enemy is within the bounds of the screen vertically.
-        # If not, correct it.
-        if not check_bounds(self):
-            if self.rect.y < 50:
-                self.rect.y = 50
-            elif self.rect.y > WINDOW_HEIGHT - self.rect.height:
-                self.rect.y = WINDOW_HEIGHT - self.rect.height
-        self.rect.x -= self.speed * _dt
-
-    def draw(self, screen: pygame.SurfaceType):
-        """
-        Draw the enemy.
-
-        Parameters
-        ----------
-        screen : pygame.SurfaceType
-            The screen to draw on.
-        """
-        screen.blit(self.image, self.rect)
-
-
-class Shuriken(pygame.sprite.Sprite):
+    Returns
+    -------
+    Inputs
+        The player inputs.
     """
-    The shuriken class.
+    if controls == "mouse":
+        x, y = pygame.mouse.get_pos()
+        return Inputs(
+            fire=pygame.mouse.get_pressed()[0],
+            mouse=(int(x * scale[0]), int(y * scale[1])),
+        )
+    keys = pygame.key.get_pressed()
+    return Inputs(
+        up=keys[pygame.K_UP],
+        down=keys[pygame.K_DOWN],
+        left=keys[pygame.K_LEFT],
+        right=keys[pygame.K_RIGHT],
+        fire=keys[pygame.K_SPACE],
+    )
+
+
+def render(
+    world: World,
+    game_ui: GameUI,
+    renderer: DirtyRenderer,
+    profiler: FrameProfiler = None,
+):
     """
+    Draw the current state of the world, update only the changed regions.
 
-    def __init__(self, x: int, y: int, speed: int, image: pygame.SurfaceType):
-        """
-        Initialize the shuriken.
-
-        Parameters
-        ----------
-        x : int
-            The x position of the shuriken.
-        y : int
-            The y position of the shuriken.
-        speed : int
-            The speed of the shuriken.
-        image : pygame.SurfaceType
-            The image of the shuriken.
-        """
-        super().__init__()
-        self.image = image
-        self.rect = self.image.get_rect()
-        self.rect.x = x
-        self.rect.y = y
-        self.speed = speed
-        self.shot_time = pygame.time.get_ticks()
-
-    def update(self, _dt: float):
-        """
-        Update the shuriken.
-        """
-        self.rect.x += self.speed * _dt
+    Parameters
+    ----------
+    world : World
+        The world to draw.
+    game_ui : GameUI
+        The game UI.
+    renderer : DirtyRenderer
+        The renderer to draw with.
+    profiler : FrameProfiler, optional
+        Times the UI, the blits and the display update, by default None
+    """
+    # Draw the background, or erase the sprites of the last frame from it
+    renderer.set_background(background_images[world.level - 1])
+    renderer.begin()
+    if profiler is not None:
+        profiler.lap("blit")
+
+    # Redraw the UI if it changed or was drawn over
+    game_ui.update_level(world.level)
+    game_ui.update_score(world.score)
+    game_ui.update_hp(world.player.hp)
+    if game_ui.dirty or renderer.touches(game_ui.rect):
+        game_ui.draw()
+        renderer.mark(game_ui.rect)
+    if profiler is not None:
+        profiler.lap("ui")
+
+    # Draw the player
+    renderer.draw(player_images[world.player.facing], world.player.rect)
+
+    # Draw the enemies
+    for enemy in world.swarm:
+        renderer.draw(enemy_image, enemy.rect)
+
+    # Draw the shurikens straight from the pool
+    projectiles = world.projectiles
+    for index in projectiles.indices():
+        renderer.draw(shuriken_image, (projectiles.x[index], projectiles.y[index]))
+    if profiler is not None:
+        profiler.lap("blit")
+
+    # Draw the performance overlay on top of everything
+    if profiler is not None and game_ui.show_perf:
+        game_ui.draw_perf(profiler)
+        renderer.mark(game_ui.perf_rect)
+        profiler.lap("ui")
+
+    # Update the changed regions of the screen
+    renderer.present()
+    if profiler is not None:
+        profiler.lap("flip")
 
 
 def game_loop(
     difficulty: str,
     controls: str,
-    player: Player,
-    enemy: Enemy,
-    score: int,
-    level: int,
-    background_image: pygame.SurfaceType,
+    world: World,
     game_ui: GameUI,
+    recorder: InputRecorder = None,
 ) -> None:
     """
     The game loop.
+    Polls the inputs and renders once per frame, while the world advances in
+    fixed ticks, so the game speed doesn't depend on the frame rate.
 
     Parameters
     ----------
     difficulty : str
-        The difficulty of the game.
+        The difficulty the world was created with.
     controls : str
         The controls of the game.
-    player : Player
-        The player.
-    enemy : Enemy
-        The enemy.
-    score : int
-        The score.
-    level : int
-        The level.
-    background_image : pygame.SurfaceType
-        The background image.
+    world : World
+        The world to play in.
     game_ui : GameUI
         The game UI.
+    recorder : InputRecorder, optional
+        Records the inputs of every tick for replaying, by default None
 
     Returns
     -------
     None
     """
-    # Set the clock
-    clock = pygame.time.Clock()
-    dt = 1
-
-    # Create the shuriken group
-    shurikens = []
+    # Set the frame pacing
+    pacer = APP.frame_pacer()
+    timestep = FixedTimestep()
+    # Draw on the canvas, scale it up to the window if it is smaller
+    canvas = APP.canvas
+    renderer = DirtyRenderer(
+        canvas,
+        window=screen if canvas is not screen else None,
+        smooth=CONFIG.smooth_upscale,
+        scale=CONFIG.view_scale,
+    )
+    scale = (
+        world.width / screen.get_width(),
+        world.height / screen.get_height(),
+    )
+    profiler = FrameProfiler()
+    world.profiler = profiler
+    telemetry = APP.telemetry
+    capture = APP.capture
+    # The world keeps the rules it was created with, whatever the pause menu sets,
+    # so its score goes on the board of their difficulty
+    rules_difficulty = difficulty
 
     while True:
         # Calculate the time since the last frame
-        dt = clock.tick(CONFIG.fps) / 5
+        frame_ms = pacer.wait()
+        profiler.begin()
 
         # Handle events
         for event in pygame.event.get():
@@ -281,162 +215,96 @@ def game_loop(
                 print("Difficulty:", difficulty)
                 controls = controller[controls_marker]
                 print("Controls:", controls)
-            # Take a screenshot
+                # Don't catch up on the time spent in the menu
+                pacer.reset()
+                timestep.reset()
+                renderer.invalidate()
+            # Take a screenshot, it is saved in the background
             elif event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:
                 img_name = (
                     f"screenshot_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.png"
                 )
-                pygame.image.save(
+                capture.screenshot(
                     screen, os.path.join(CONFIG.paths.screenshots, img_name)
                 )
-
-        if controls == "keyboard":
-            # Check if the player is moved with keyboard
-            keys = pygame.key.get_pressed()
-            if any(
-                [
-                    keys[pygame.K_UP],
-                    keys[pygame.K_DOWN],
-                    keys[pygame.K_LEFT],
-                    keys[pygame.K_RIGHT],
-                ]
-            ):
-                player.update_keyboard(keys, dt)
-
-        if controls == "mouse":
-            # Check if the player is moved with mouse
-            if pygame.mouse.get_pos() != (player.rect.x, player.rect.y):
-                mouse_position = pygame.mouse.get_pos()
-                player.update_mouse(mouse_position, dt)
-
-        # Move the enemy
-        enemy.update(dt)
-
-        # Check if the enemy is off the screen
-        if enemy.rect.x < -96:
-            enemy.speed += ENEMY_SPEED_INCREASE
-            score += 1
-            level = score // 10 + 1
-            enemy.rect.x = WINDOW_WIDTH
-            enemy.rect.y = random.randint(50, WINDOW_HEIGHT - 96)
-            enemy.hp = BASE_ENEMY_HP
-
-        # Check for collisions
-        if detect_collision(player, enemy):
-            old_score = score
-            score = 0
-            level = 1
-            player.hp -= 1
-            enemy.speed = BASE_ENEMY_SPEED
-            enemy.rect.x = WINDOW_WIDTH
-            enemy.rect.y = random.randint(0, WINDOW_HEIGHT - (50 + 96))
-            enemy.hp = BASE_ENEMY_HP
+            # Start or stop capturing the frames
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F9:
+                if capture.recording:
+                    capture.stop()
+                else:
+                    capture_name = (
+                        f"capture_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.gif"
+                    )
+                    capture.start(os.path.join(CONFIG.paths.screenshots, capture_name))
+            # Toggle the performance overlay
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                game_ui.show_perf = not game_ui.show_perf
+                renderer.invalidate()
+        profiler.lap("events")
+
+        # Advance the world
+        inputs = read_inputs(controls, scale)
+        profiler.lap("input")
+        for _ in range(timestep.advance(frame_ms)):
+            if recorder is not None:
+                recorder.record(inputs)
+            if world.step(inputs, TICK_DT) is not None:
+                break
+
+        # Losing resets the level, so the level reached is derived from the score
+        final_level = min(world.final_score // 10 + 1, world.rules.max_level)
+
+        # Record the score of the game, it is written in the background
+        if world.outcome is not None:
+            APP.leaderboard.submit(
+                rules_difficulty,
+                controls,
+                world.final_score,
+                final_level,
+                world.outcome,
+                world.ticks,
+                world.seed,
+            )
+
+        # Report the end of the game
+        if world.outcome is not None and telemetry is not None:
+            telemetry.event(
+                "game_over",
+                outcome=world.outcome,
+                score=world.final_score,
+                level=final_level,
+                ticks=world.ticks,
+                seed=world.seed,
+            )
 
         # Check if the player is dead
-        if player.hp <= 0:
-            lose(screen, old_score)
+        if world.outcome == "lost":
+            lose(screen, world.final_score)
             pygame.mouse.set_visible(True)
             return None
 
-        # Check if player is shooting a shuriken.
-        # Create a shuriken if there are less than 3 shurikens on screen
-        if controls == "keyboard":
-            if keys[pygame.K_SPACE]:
-                if len(shurikens) < 3:
-                    shuriken = Shuriken(
-                        x=player.rect.x + 96,
-                        y=player.rect.y + 48,
-                        speed=SHURIKEN_SPEED,
-                        image=shuriken_image,
-                    )
-                    shurikens.append(shuriken)
-        if controls == "mouse":
-            if pygame.mouse.get_pressed()[0]:
-                if len(shurikens) < 3:
-                    shuriken = Shuriken(
-                        x=player.rect.x + 96,
-                        y=player.rect.y + 48,
-                        speed=SHURIKEN_SPEED,
-                        image=shuriken_image,
-                    )
-                    shurikens.append(shuriken)
-
-        # Move the shurikens
-        shurikens_to_remove = []
-        for idx, shuriken in enumerate(shurikens):
-            shuriken.update(dt)
-            if shuriken.rect.x > WINDOW_WIDTH:
-                shuriken.kill()
-                shurikens_to_remove.append(idx)
-        if len(shurikens_to_remove) > 0:
-            shurikens_to_remove.sort(reverse=True)
-            for idx in shurikens_to_remove:
-                del shurikens[idx]
-
-        # Check for shuriken collisions
-        shurikens_to_remove = []
-        for idx, shuriken in enumerate(shurikens):
-            if detect_collision(shuriken, enemy):
-                enemy.hp -= 1
-                shuriken.kill()
-                shurikens_to_remove.append(idx)
-                if enemy.hp <= 0:
-                    enemy.rect.x = WINDOW_WIDTH
-                    enemy.rect.y = random.randint(0, WINDOW_HEIGHT - 96)
-                    enemy.speed += ENEMY_SPEED_INCREASE
-                    enemy.hp = BASE_ENEMY_HP
-                    score += 2
-                    level = score // 10 + 1
-
-        # Remove the shurikens that collided with the enemy
-        if len(shurikens_to_remove) > 0:
-            shurikens_to_remove.sort(reverse=True)
-            for idx in shurikens_to_remove:
-                del shurikens[idx]
-
         # Check if max level is reached
-        if level > CONFIG.max_level:
+        if world.outcome == "won":
             pygame.event.clear()
-            win(screen, score)
+            win(screen, world.score)
             return None
 
-        # Update UI elements
-        game_ui.update_level(level)
-        game_ui.update_score(score)
-
-        # Draw the background
-        background_image = background_images[level - 1]
-        screen.blit(background_image, (0, 0))
-
-        # Redraw UI
-        game_ui.draw(player.hp)
-
-        # Draw the player
-        screen.blit(player.image, (player.rect.x, player.rect.y))
-
-        # Draw the enemy
-        screen.blit(enemy.image, (enemy.rect.x, enemy.rect.y))
-
-        # Draw the shurikens
-        for shuriken in shurikens:
-            screen.blit(shuriken.image, (shuriken.rect.x, shuriken.rect.y))
-
-        # Update the screen
-        pygame.display.update()
+        render(world, game_ui, renderer, profiler)
+        capture.frame(screen)
+        profiler.end(frame_ms)
+        if CONFIG.adaptive_upscale and renderer.window is not None:
+            renderer.adapt(sum(profiler.current.values()), 1000 / CONFIG.fps)
+        if telemetry is not None:
+            telemetry.frame(frame_ms, world)
 
 
 if __name__ == "__main__":
-    # Initialize pygame
-    pygame.init()
-    screen = screen_init("Ninja vs. Bakugan", (WINDOW_WIDTH, WINDOW_HEIGHT))
+    # Initialize pygame and open the window
+    APP.init()
+    screen = APP.screen
 
     # Load the images
-    player_image = load_sprite("ninja.png", (96, 96))
-    player_side_image = load_sprite("ninja_side.png", (72, 96))
-    enemy_image = load_sprite("enemy.png", (96, 96))
-    background_images = load_backgrounds(CONFIG.max_level)
-    background_image = background_images[0]
-    shuriken_image = load_sprite("shuriken.png", (32, 32))
+    load_images()
 
     # Start main loop
     while True:
@@ -449,55 +317,42 @@ if __name__ == "__main__":
         print("Difficulty:", difficulty)
         print("Controls:", controls)
 
-        # Create the player, enemy and shuriken speed based on the difficulty
-        match difficulty:
-            case "easy":
-                SHURIKEN_SPEED = 2.5
-                BASE_ENEMY_SPEED = 0.8
-                BASE_ENEMY_HP = 0.8
-                BASE_PLAYER_SPEED = 1.2
-                ENEMY_SPEED_INCREASE = 0.05
-            case "medium":
-                SHURIKEN_SPEED = 2
-                BASE_ENEMY_SPEED = 1
-                BASE_ENEMY_HP = 2
-                BASE_PLAYER_SPEED = 1
-                ENEMY_SPEED_INCREASE = 0.1
-            case "hard":
-                SHURIKEN_SPEED = 2
-                BASE_ENEMY_SPEED = 1.2
-                BASE_ENEMY_HP = 3
-                BASE_PLAYER_SPEED = 1
-                ENEMY_SPEED_INCREASE = 0.15
-        player = Player(
-            x=100,
-            y=WINDOW_HEIGHT / 2,
-            speed=BASE_PLAYER_SPEED,
-            hp=5,
-            image=player_image,
-        )
-        enemy = Enemy(
-            x=WINDOW_WIDTH,
-            y=random.randint(0, WINDOW_HEIGHT - 96),
-            speed=BASE_ENEMY_SPEED,
-            hp=BASE_ENEMY_HP,
-            image=enemy_image,
+        # Create the world with the player, enemy and shuriken speed based on the difficulty
+        world = World(
+            Rules.for_difficulty(
+                difficulty,
+                CONFIG.max_level,
+                CONFIG.difficulties,
+                swarm_size=CONFIG.swarm_size,
+                max_shurikens=CONFIG.max_shurikens,
+            ),
+            CONFIG.logical_resolution,
         )
 
         if controls == "mouse":
-            # Set the mouse position to the player position
-            pygame.mouse.set_pos(player.rect.x, player.rect.y)
+            # Set the mouse position to the player position, in window coordinates
+            pygame.mouse.set_pos(
+                world.player.x * screen.get_width() / world.width,
+                world.player.y * screen.get_height() / world.height,
+            )
             pygame.mouse.set_visible(False)
 
-        # Set the score and level
-        score = 0
-        level = 1
+        # Create the game UI, at the scale of the playing field on the canvas
+        game_ui = GameUI(APP.canvas, scale=CONFIG.view_scale[1])
+        game_ui.draw(world.player.hp)
 
-        # Create the game UI
-        game_ui = GameUI(screen, CONFIG.ui_font)
-        game_ui.draw(player.hp)
+        # Record the session, so it can be replayed
+        recorder = None
+        if CONFIG.record_replays:
+            os.makedirs(CONFIG.paths.replays, exist_ok=True)
+            replay_name = f"replay_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.nvbr"
+            recorder = InputRecorder(
+                os.path.join(CONFIG.paths.replays, replay_name), world
+            )
 
         # The game loop
-        game_loop(
-            difficulty, controls, player, enemy, score, level, background_image, game_ui
-        )
+        try:
+            game_loop(difficulty, controls, world, game_ui, recorder)
+        finally:
+            if recorder is not None:
+                recorder.close()
@@ -0,0 +1,213 @@
+"""
+Persistent high-score leaderboard.
+
+The scores are kept in an SQLite database in WAL mode. The game only queues
+finished games, a background thread inserts them in batches, one transaction
+per batch, so the game loop never waits for the disk. The top scores of a
+difficulty and controls mode are read through an index, so the queries stay
+fast however many games are stored. A batch that can't be written is logged
+and skipped, the writer keeps going.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    id INTEGER PRIMARY KEY,
+    played_at REAL NOT NULL,
+    difficulty TEXT NOT NULL,
+    controls TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    outcome TEXT NOT NULL,
+    ticks INTEGER NOT NULL,
+    seed INTEGER
+);
+CREATE INDEX IF NOT EXISTS scores_top
+    ON scores (difficulty, controls, score DESC, played_at);
+"""
+INSERT = (
+    "INSERT INTO scores (played_at, difficulty, controls, score, level, outcome,"
+    " ticks, seed) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+TOP = (
+    "SELECT score, level, outcome, played_at FROM scores"
+    " WHERE difficulty = ? AND controls = ?"
+    " ORDER BY score DESC, played_at LIMIT ?"
+)
+
+
+class Entry(NamedTuple):
+    """
+    A game on the leaderboard.
+    """
+
+    score: int
+    level: int
+    outcome: str
+    played_at: float
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Open the database, create the table and the index if they don't exist yet.
+
+    Parameters
+    ----------
+    path : str
+        The path of the database file.
+
+    Returns
+    -------
+    sqlite3.Connection
+        The connection to the database.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=5)
+    # Readers don't block the writer and the writer doesn't block readers,
+    # and a commit doesn't wait for the data to reach the disk
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class Leaderboard:
+    """
+    The high scores, written to the database on a background thread.
+    """
+
+    def __init__(self, path: str, batch_size: int = 256, max_pending: int = 4096):
+        """
+        Initialize the leaderboard and start the writer thread.
+
+        Parameters
+        ----------
+        path : str
+            The path of the database file.
+        batch_size : int, optional
+            The most games inserted in one transaction, by default 256
+        max_pending : int, optional
+            The number of games waiting for the writer, by default 4096.
+            Games are dropped rather than blocking the game when it is full.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.failed = 0
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.reader = None
+        self.writer = threading.Thread(
+            target=self._write, name="leaderboard-writer", daemon=True
+        )
+        self.writer.start()
+
+    def submit(
+        self,
+        difficulty: str,
+        controls: str,
+        score: int,
+        level: int,
+        outcome: str,
+        ticks: int,
+        seed: int = None,
+    ):
+        """
+        Queue a finished game for writing, without ever blocking.
+
+        Parameters
+        ----------
+        difficulty : str
+            The difficulty of the game.
+        controls : str
+            The controls of the game.
+        score : int
+            The final score.
+        level : int
+            The level reached.
+        outcome : str
+            The outcome of the game: "won" or "lost".
+        ticks : int
+            The length of the game in simulation ticks.
+        seed : int, optional
+            The seed of the game, by default None
+        """
+        row = (time.time(), difficulty, controls, score, level, outcome, ticks, seed)
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def top(self, difficulty: str, controls: str, limit: int = 10) -> list[Entry]:
+        """
+        Get the best games of a difficulty and controls mode.
+        Games still waiting for the writer aren't included yet.
+
+        Parameters
+        ----------
+        difficulty : str
+            The difficulty of the games.
+        controls : str
+            The controls of the games.
+        limit : int, optional
+            The number of games, by default 10
+
+        Returns
+        -------
+        list[Entry]
+            The games with the highest scores, the earlier game first on a tie.
+        """
+        if self.reader is None:
+            self.reader = connect(self.path)
+        rows = self.reader.execute(TOP, (difficulty, controls, limit))
+        return [Entry(*row) for row in rows]
+
+    def close(self):
+        """Write the pending games, stop the writer and close the database."""
+        if self.writer.is_alive():
+            # Wait for the queue to have room for the sentinel, the writer drains it
+            self.queue.put(None)
+            self.writer.join()
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def _write(self):
+        """Insert the queued games in batches, runs on the writer thread."""
+        connection = None
+        try:
+            while True:
+                row = self.queue.get()
+                if row is None:
+                    return
+                rows = [row]
+                # Insert everything queued up in one transaction
+                while len(rows) < self.batch_size and not self.queue.empty():
+                    row = self.queue.get_nowait()
+                    if row is None:
+                        break
+                    rows.append(row)
+                try:
+                    if connection is None:
+                        connection = connect(self.path)
+                    self._insert(connection, rows)
+                except (sqlite3.Error, OSError):
+                    # A locked or full database loses this batch, not the writer
+                    self.failed += len(rows)
+                    logging.exception("Leaderboard write failed: %d games", len(rows))
+                if row is None:
+                    return
+        finally:
+            if connection is not None:
+                connection.close()
+
+    @staticmethod
+    def _insert(connection: sqlite3.Connection, rows: list[tuple]):
+        """Insert a batch of games in one transaction."""
+        with connection:
+            connection.executemany(INSERT, rows)
@@ -0,0 +1,91 @@
+"""
+Frame pacing of the game loop and the menus.
+
+The game speed doesn't depend on the pacing, the world advances in fixed ticks
+by the measured frame time, so every mode plays the same:
+
+- fixed: pygame's Clock.tick, sleeps with a coarse granularity.
+- precise: sleeps until shortly before the frame is due, then spins on a high
+  resolution timer. Frames are due on a fixed schedule, so the errors don't
+  add up.
+- vsync: the display flip waits for the refresh of the monitor.
+- uncapped: doesn't wait at all, for benchmarking.
+"""
+import time
+import pygame
+
+PACING_MODES = ("fixed", "precise", "vsync", "uncapped")
+# The precise pacing spins for the last this many seconds before a frame is due
+SPIN_S = 0.002
+
+
+class FramePacer:
+    """
+    Waits for the next frame and measures the frame times.
+    """
+
+    def __init__(self, mode: str = "precise", fps: int = 60):
+        """
+        Initialize the pacer.
+
+        Parameters
+        ----------
+        mode : str, optional
+            The pacing mode, one of PACING_MODES, by default precise
+        fps : int, optional
+            The target frame rate of the fixed and the precise pacing,
+            by default 60
+
+        Raises
+        ------
+        ValueError
+            If the pacing mode is unknown.
+        """
+        if mode not in PACING_MODES:
+            raise ValueError(
+                f"Unknown frame pacing {mode!r}, expected one of {PACING_MODES}"
+            )
+        self.mode = mode
+        self.fps = fps
+        self.period = 1 / fps
+        self.clock = pygame.time.Clock()
+        self.reset()
+
+    def reset(self):
+        """Start timing anew, e.g. after the game was paused."""
+        self.last = time.perf_counter()
+        self.deadline = self.last + self.period
+        self.clock.tick()
+
+    def wait(self) -> float:
+        """
+        Wait until the next frame is due.
+
+        Returns
+        -------
+        float
+            The time since the previous frame in milliseconds.
+        """
+        match self.mode:
+            case "fixed":
+                self.clock.tick(self.fps)
+            case "precise":
+                self._wait_precise()
+        # The vsync pacing waits in the display flip, the uncapped doesn't wait
+        now = time.perf_counter()
+        frame_ms = (now - self.last) * 1000
+        self.last = now
+        return frame_ms
+
+    def _wait_precise(self):
+        """Sleep, then spin until the deadline, and schedule the next frame."""
+        remaining = self.deadline - time.perf_counter()
+        if remaining > SPIN_S:
+            time.sleep(remaining - SPIN_S)
+        while time.perf_counter() < self.deadline:
+            pass
+        self.deadline += self.period
+        # Don't rush through frames to catch up after a slow one
+        now = time.perf_counter()
+        if self.deadline < now:
+            self.deadline = now + self.period
@@ -0,0 +1,109 @@
+"""
+Lightweight per-stage frame profiler.
+
+The game loop marks the end of each stage of a frame with a lap, the time since
+the previous lap is added to that stage. The last frames are kept in a ring
+buffer, for the performance overlay.
+"""
+import time
+import numpy as np
+
+# The stages of a frame, in the order they run
+STAGES = ("events", "input", "physics", "collision", "ui", "blit", "flip")
+
+
+class FrameProfiler:
+    """
+    Rolling record of the frame times, split into the stages of the frame.
+    """
+
+    def __init__(self, history: int = 120):
+        """
+        Initialize the profiler.
+
+        Parameters
+        ----------
+        history : int, optional
+            The number of frames to keep, by default 120
+        """
+        self.history = history
+        self.frame_ms = np.zeros(history)
+        self.stage_ms = np.zeros((history, len(STAGES)))
+        self.frames = 0
+        self.current = dict.fromkeys(STAGES, 0.0)
+        self.last = time.perf_counter()
+
+    def begin(self):
+        """Start timing a new frame."""
+        for stage in self.current:
+            self.current[stage] = 0.0
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str):
+        """
+        Add the time since the last lap to a stage.
+
+        Parameters
+        ----------
+        stage : str
+            The stage that just ended, one of STAGES.
+        """
+        now = time.perf_counter()
+        self.current[stage] += (now - self.last) * 1000
+        self.last = now
+
+    def end(self, frame_ms: float):
+        """
+        Finish the frame.
+
+        Parameters
+        ----------
+        frame_ms : float
+            The time since the previous frame in milliseconds, including the
+            time spent waiting for the frame cap.
+        """
+        slot = self.frames % self.history
+        self.frame_ms[slot] = frame_ms
+        self.stage_ms[slot] = [self.current[stage] for stage in STAGES]
+        self.frames += 1
+
+    def frame_times(self) -> np.ndarray:
+        """
+        Get the recorded frame times, oldest first.
+
+        Returns
+        -------
+        np.ndarray
+            The frame times in milliseconds.
+        """
+        if self.frames < self.history:
+            return self.frame_ms[: self.frames]
+        return np.roll(self.frame_ms, -(self.frames % self.history))
+
+    def averages(self) -> dict[str, float]:
+        """
+        Get the mean time of each stage over the recorded frames.
+
+        Returns
+        -------
+        dict[str, float]
+            The mean times in milliseconds, keyed by stage.
+        """
+        count = min(self.frames, self.history)
+        if count == 0:
+            return dict.fromkeys(STAGES, 0.0)
+        means = self.stage_ms[:count].mean(axis=0)
+        return dict(zip(STAGES, means.tolist()))
+
+    def fps(self) -> float:
+        """
+        Get the mean frame rate over the recorded frames.
+
+        Returns
+        -------
+        float
+            The frames per second, 0 before the first frame.
+        """
+        times = self.frame_times()
+        mean = times.mean() if len(times) else 0.0
+        return 1000 / mean if mean > 0 else 0.0
@@ -0,0 +1,355 @@
+"""
+Recording and replaying game sessions.
+
+A replay stores the rules, the field size and the seed of a World, followed by
+the inputs of every simulation tick in 5 bytes each. Since the World only
+depends on those, replaying the inputs reproduces the session exactly, and it
+runs headless as fast as the simulation allows.
+
+A finished recording ends with a trailer holding the tick count, the outcome,
+the score and the digest of the final world, so a replay doubles as a
+regression test: playing it back checks the simulation still ends the same way.
+
+Replay and verify a recorded session with:
+
+    python replay.py replays/replay_2024-01-01_12-00-00.nvbr
+
+It exits with status 1 if the playback doesn't match the recording.
+"""
+import argparse
+import dataclasses
+import hashlib
+import json
+import struct
+import time
+import numpy as np
+from simulation import Inputs, Rules, World
+
+# Magic, format version, seed and size of the JSON metadata
+HEADER = struct.Struct("<4sHQI")
+MAGIC = b"NVBR"
+VERSION = 2
+# Size of the JSON trailer and its magic, at the very end of a finished recording
+TRAILER = struct.Struct("<I4s")
+TRAILER_MAGIC = b"NVBE"
+# Pressed keys and mouse position of a tick
+TICK_RECORD = np.dtype([("flags", "u1"), ("x", "<u2"), ("y", "<u2")])
+
+# Bits of the flags of a tick
+UP, DOWN, LEFT, RIGHT, FIRE, MOUSE = (1 << bit for bit in range(6))
+
+
+def encode_inputs(inputs: Inputs) -> bytes:
+    """
+    Pack the inputs of a tick into a record.
+
+    Parameters
+    ----------
+    inputs : Inputs
+        The inputs of the tick.
+
+    Returns
+    -------
+    bytes
+        The record of the tick.
+    """
+    flags = (
+        UP * bool(inputs.up)
+        | DOWN * bool(inputs.down)
+        | LEFT * bool(inputs.left)
+        | RIGHT * bool(inputs.right)
+        | FIRE * bool(inputs.fire)
+    )
+    x = y = 0
+    if inputs.mouse is not None:
+        flags |= MOUSE
+        x, y = inputs.mouse
+    return struct.pack("<BHH", flags, x, y)
+
+
+def decode_inputs(flags: int, x: int, y: int) -> Inputs:
+    """
+    Unpack the inputs of a tick from a record.
+
+    Parameters
+    ----------
+    flags : int
+        The pressed keys and whether the mouse is used.
+    x : int
+        The x coordinate of the mouse.
+    y : int
+        The y coordinate of the mouse.
+
+    Returns
+    -------
+    Inputs
+        The inputs of the tick.
+    """
+    return Inputs(
+        up=bool(flags & UP),
+        down=bool(flags & DOWN),
+        left=bool(flags & LEFT),
+        right=bool(flags & RIGHT),
+        fire=bool(flags & FIRE),
+        mouse=(x, y) if flags & MOUSE else None,
+    )
+
+
+class InputRecorder:
+    """
+    Writes the inputs of a session to a replay file, tick by tick.
+    """
+
+    def __init__(self, path: str, world: World):
+        """
+        Start recording a session.
+
+        Parameters
+        ----------
+        path : str
+            The path of the replay file.
+        world : World
+            The world of the session, before its first tick.
+        """
+        self.path = path
+        self.world = world
+        self.ticks = 0
+        metadata = json.dumps(
+            {"rules": dataclasses.asdict(world.rules), "size": list(world.size)}
+        ).encode("utf8")
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, world.seed, len(metadata)))
+        self.file.write(metadata)
+
+    def record(self, inputs: Inputs):
+        """
+        Record the inputs of the next tick.
+
+        Parameters
+        ----------
+        inputs : Inputs
+            The inputs passed to World.step.
+        """
+        self.file.write(encode_inputs(inputs))
+        self.ticks += 1
+
+    def close(self):
+        """Finish the recording, write the final state of the world to check against."""
+        if self.file.closed:
+            return
+        trailer = json.dumps(expected_state(self.world)).encode("utf8")
+        self.file.write(trailer)
+        self.file.write(TRAILER.pack(len(trailer), TRAILER_MAGIC))
+        self.file.close()
+
+    def __enter__(self) -> "InputRecorder":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@dataclasses.dataclass
+class Replay:
+    """
+    A recorded session.
+    """
+
+    rules: Rules
+    size: tuple[int, int]
+    seed: int
+    records: np.ndarray
+    expected: dict = None
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        """
+        Load a replay file.
+
+        Parameters
+        ----------
+        path : str
+            The path of the replay file.
+
+        Returns
+        -------
+        Replay
+            The recorded session.
+
+        Raises
+        ------
+        ValueError
+            If the file is not a replay of a supported version.
+        """
+        with open(path, "rb") as replay_file:
+            data = replay_file.read()
+        magic, version, seed, metadata_length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a version {VERSION} replay: {path}")
+        start = HEADER.size + metadata_length
+        metadata = json.loads(data[HEADER.size : start])
+        # A recording without a trailer wasn't finished, e.g. the game crashed
+        end = len(data)
+        expected = None
+        if end - start >= TRAILER.size:
+            trailer_length, trailer_magic = TRAILER.unpack_from(
+                data, end - TRAILER.size
+            )
+            if trailer_magic == TRAILER_MAGIC:
+                end -= TRAILER.size + trailer_length
+                expected = json.loads(data[end : end + trailer_length])
+        # Drop a partial record
+        end = start + (end - start) // TICK_RECORD.itemsize * TICK_RECORD.itemsize
+        return cls(
+            rules=Rules(**metadata["rules"]),
+            size=tuple(metadata["size"]),
+            seed=seed,
+            records=np.frombuffer(data[start:end], dtype=TICK_RECORD),
+            expected=expected,
+        )
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def inputs(self) -> list[Inputs]:
+        """
+        Get the recorded inputs.
+
+        Returns
+        -------
+        list[Inputs]
+            The inputs of every tick, in order.
+        """
+        return [
+            decode_inputs(flags, x, y)
+            for flags, x, y in zip(
+                self.records["flags"].tolist(),
+                self.records["x"].tolist(),
+                self.records["y"].tolist(),
+            )
+        ]
+
+    def play(self, verify: bool = True) -> World:
+        """
+        Replay the session headless, as fast as possible.
+
+        Parameters
+        ----------
+        verify : bool, optional
+            Whether to check the final world against the recording,
+            by default True
+
+        Returns
+        -------
+        World
+            The world after the last recorded tick, or when the game ended.
+
+        Raises
+        ------
+        ValueError
+            If verifying and the final world doesn't match the recording.
+        """
+        world = World(self.rules, self.size, seed=self.seed)
+        for inputs in self.inputs():
+            if world.step(inputs) is not None:
+                break
+        if verify:
+            mismatches = self.verify(world)
+            if mismatches:
+                raise ValueError(f"Replay doesn't match: {', '.join(mismatches)}")
+        return world
+
+    def verify(self, world: World) -> list[str]:
+        """
+        Compare a played back world with the recording.
+
+        Parameters
+        ----------
+        world : World
+            The world after playing the replay.
+
+        Returns
+        -------
+        list[str]
+            The differences, as "name: recorded != replayed". Empty if they
+            match, or if the recording has no trailer to compare with.
+        """
+        if self.expected is None:
+            return []
+        actual = expected_state(world)
+        return [
+            f"{name}: {self.expected[name]} != {actual[name]}"
+            for name in actual
+            if self.expected.get(name) != actual[name]
+        ]
+
+
+def world_digest(world: World) -> str:
+    """
+    Hash the state of a world, to compare a replay with an earlier playback.
+
+    Parameters
+    ----------
+    world : World
+        The world to hash.
+
+    Returns
+    -------
+    str
+        The hex digest of the world state.
+    """
+    digest = hashlib.sha1()
+    for value in (world.ticks, world.score, world.level, world.outcome):
+        digest.update(repr(value).encode("utf8"))
+    digest.update(repr((world.player.x, world.player.y, world.player.hp)).encode())
+    for store in (world.enemies, world.projectiles):
+        for array in (store.x, store.y, store.speed, store.hp, store.active):
+            digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def expected_state(world: World) -> dict:
+    """
+    Summarize the final state of a world, as stored in the replay trailer.
+
+    Parameters
+    ----------
+    world : World
+        The world to summarize.
+
+    Returns
+    -------
+    dict
+        The ticks, outcome, score and digest of the world.
+    """
+    return {
+        "ticks": world.ticks,
+        "outcome": world.outcome,
+        "score": world.score,
+        "digest": world_digest(world),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded session.")
+    parser.add_argument("path", help="the replay file")
+    args = parser.parse_args()
+    replay = Replay.load(args.path)
+    start = time.perf_counter()
+    world = replay.play(verify=False)
+    elapsed = time.perf_counter() - start
+    print(f"Ticks: {world.ticks} of {len(replay)} recorded, seed {replay.seed}")
+    print(f"Outcome: {world.outcome}, score {world.score}, level {world.level}")
+    print(
+        f"Replayed in {elapsed:.3f} s ({world.ticks / max(elapsed, 1e-9):.0f} ticks/s)"
+    )
+    print(f"Digest: {world_digest(world)}")
+    if replay.expected is None:
+        print("Unfinished recording, nothing to verify")
+    else:
+        mismatches = replay.verify(world)
+        for mismatch in mismatches:
+            print(f"Mismatch: {mismatch}")
+        if mismatches:
+            raise SystemExit(1)
+        print("Verified: the playback matches the recording")
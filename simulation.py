@@ -0,0 +1,523 @@
+"""
+Headless simulation core of the game.
+
+The World holds the complete game state and advances it with fixed-size time
+steps, without touching the display, so the game rules can be run without a
+window, e.g. for testing and balancing.
+"""
+import random
+from dataclasses import dataclass
+from typing import NamedTuple
+import numpy as np
+from collision import SpatialHash, brute_force_pairs
+from entities import (
+    EntityStore,
+    Enemy,
+    Player,
+    ProjectilePool,
+    move_enemies,
+    move_projectiles,
+)
+
+# Simulation ticks per second. The game logic always advances in steps of this size,
+# independently of the rendering frame rate.
+TICK_RATE = 60
+TICK_MS = 1000 / TICK_RATE
+# Speeds are expressed in pixels per SPEED_UNIT_MS milliseconds.
+SPEED_UNIT_MS = 5
+TICK_DT = TICK_MS / SPEED_UNIT_MS
+SHURIKEN_SIZE = (32, 32)
+# Smallest number of possible shuriken-enemy pairs to use the spatial hash for,
+# about where it overtakes checking every pair in benchmarks/swarm.py, at 600
+# enemies against 150 shurikens. Normal play checks 3 pairs and never uses it,
+# neither does a swarm with the shipped 3 shurikens: at most one shuriken is
+# fired per tick, so few are in flight and checking all of them stays cheaper.
+BROADPHASE_MIN_PAIRS = 100_000
+
+
+class Inputs(NamedTuple):
+    """
+    The player inputs for one simulation tick.
+    """
+
+    up: bool = False
+    down: bool = False
+    left: bool = False
+    right: bool = False
+    fire: bool = False
+    mouse: tuple[int, int] = None
+
+
+# The rules of the difficulties, as Rules keyword arguments. The difficulties
+# section of the config file is applied over these.
+DIFFICULTIES = {
+    "easy": {
+        "shuriken_speed": 2.5,
+        "base_enemy_speed": 0.8,
+        "base_enemy_hp": 0.8,
+        "base_player_speed": 1.2,
+        "enemy_speed_increase": 0.05,
+    },
+    "medium": {
+        "shuriken_speed": 2,
+        "base_enemy_speed": 1,
+        "base_enemy_hp": 2,
+        "base_player_speed": 1,
+        "enemy_speed_increase": 0.1,
+    },
+    "hard": {
+        "shuriken_speed": 2,
+        "base_enemy_speed": 1.2,
+        "base_enemy_hp": 3,
+        "base_player_speed": 1,
+        "enemy_speed_increase": 0.15,
+    },
+}
+# The values that can change from level to level
+LEVEL_CURVES = ("enemy_speed", "enemy_hp", "spawn_delay", "max_shurikens")
+
+
+class LevelTable(NamedTuple):
+    """
+    The rules of every level, compiled from the base values and the level curves.
+    Indexed by the level, from 0 to max_level + 1, index 0 repeats level 1.
+    """
+
+    enemy_speed: tuple[float, ...]
+    enemy_hp: tuple[float, ...]
+    # How far off the screen respawned enemies start, per unit of their speed
+    spawn_distance: tuple[float, ...]
+    max_shurikens: tuple[int, ...]
+
+
+@dataclass(frozen=True)
+class Rules:
+    """
+    The game rules, based on the difficulty.
+
+    The level curves are added to the base values level by level, the first
+    value to level 1, and the last value holds for the levels after it. Empty
+    curves keep the base values on every level.
+    """
+
+    shuriken_speed: float
+    base_enemy_speed: float
+    base_enemy_hp: float
+    base_player_speed: float
+    enemy_speed_increase: float
+    max_level: int = 10
+    player_hp: int = 5
+    max_shurikens: int = 3
+    swarm_size: int = 1
+    spawn_delay: float = 0.0
+    enemy_speed_levels: tuple[float, ...] = ()
+    enemy_hp_levels: tuple[float, ...] = ()
+    spawn_delay_levels: tuple[float, ...] = ()
+    max_shurikens_levels: tuple[int, ...] = ()
+
+    def __post_init__(self):
+        """
+        Compile the level table.
+
+        Raises
+        ------
+        ValueError
+            If a value is out of range on any level.
+        """
+        for curve in LEVEL_CURVES:
+            # Curves read from JSON or YAML are lists
+            object.__setattr__(
+                self, f"{curve}_levels", tuple(getattr(self, f"{curve}_levels"))
+            )
+        if self.max_level < 1:
+            raise ValueError(f"max_level has to be at least 1, not {self.max_level}")
+        if self.swarm_size < 1:
+            raise ValueError(f"swarm_size has to be at least 1, not {self.swarm_size}")
+        if self.shuriken_speed <= 0 or self.base_player_speed <= 0:
+            raise ValueError("The shuriken and the player speed have to be positive")
+
+        def level_curve(name: str, base: float) -> tuple:
+            offsets = getattr(self, f"{name}_levels") or (0,)
+            values = [
+                base + offsets[min(level, len(offsets)) - 1]
+                for level in range(1, self.max_level + 2)
+            ]
+            return (values[0], *values)
+
+        levels = LevelTable(
+            enemy_speed=level_curve("enemy_speed", self.base_enemy_speed),
+            enemy_hp=level_curve("enemy_hp", self.base_enemy_hp),
+            spawn_distance=tuple(
+                delay * 1000 / SPEED_UNIT_MS
+                for delay in level_curve("spawn_delay", self.spawn_delay)
+            ),
+            max_shurikens=tuple(
+                int(value) for value in level_curve("max_shurikens", self.max_shurikens)
+            ),
+        )
+        if min(levels.enemy_speed) < 0:
+            raise ValueError("The enemy speed can't be negative on any level")
+        if min(levels.enemy_hp) <= 0:
+            raise ValueError("The enemy HP has to be positive on every level")
+        if min(levels.spawn_distance) < 0:
+            raise ValueError("The spawn delay can't be negative on any level")
+        if min(levels.max_shurikens) < 1:
+            raise ValueError("At least 1 shuriken has to be allowed on every level")
+        object.__setattr__(self, "levels", levels)
+
+    @property
+    def shuriken_capacity(self) -> int:
+        """The most shurikens in flight on any level."""
+        return max(self.levels.max_shurikens)
+
+    @classmethod
+    def for_difficulty(
+        cls,
+        difficulty: str,
+        max_level: int = 10,
+        difficulties: dict = None,
+        **overrides,
+    ) -> "Rules":
+        """
+        Create the rules for a given difficulty.
+
+        Parameters
+        ----------
+        difficulty : str
+            The difficulty of the game: easy, medium or hard.
+        max_level : int, optional
+            The level to reach to win the game, by default 10
+        difficulties : dict, optional
+            The rules of the difficulties, e.g. CONFIG.difficulties,
+            by default DIFFICULTIES
+        **overrides
+            Values to use instead of the defaults, e.g. swarm_size.
+
+        Returns
+        -------
+        Rules
+            The rules of the game.
+        """
+        difficulties = DIFFICULTIES if difficulties is None else difficulties
+        if difficulty not in difficulties:
+            raise ValueError(f"Unknown difficulty: {difficulty}")
+        return cls(**{**difficulties[difficulty], "max_level": max_level, **overrides})
+
+
+def load_difficulties(section: dict, max_level: int, **overrides) -> dict[str, dict]:
+    """
+    Validate the difficulties section of the config file.
+
+    Parameters
+    ----------
+    section : dict
+        The rules of the difficulties by name, with the Rules values and
+        optionally a levels mapping of curve names to lists of values.
+    max_level : int
+        The level to reach to win the game.
+    **overrides
+        The values the game plays every difficulty with, e.g. the swarm_size
+        and max_shurikens of the config, so the rules are checked as played.
+
+    Returns
+    -------
+    dict[str, dict]
+        The rules of every difficulty as Rules keyword arguments, the section
+        applied over DIFFICULTIES.
+
+    Raises
+    ------
+    ValueError
+        If the section is malformed or the rules are out of range.
+    """
+    difficulties = {name: dict(rules) for name, rules in DIFFICULTIES.items()}
+    values = {
+        name
+        for name in Rules.__dataclass_fields__
+        if not name.endswith("_levels")
+        and name not in ("max_level", "max_shurikens", "swarm_size")
+    }
+    for name, profile in (section or {}).items():
+        if name not in difficulties:
+            raise ValueError(f"Unknown difficulty in the config: {name}")
+        if not isinstance(profile, dict):
+            raise ValueError(f"The difficulty {name} has to be a mapping")
+        for key, value in profile.items():
+            if key == "levels":
+                if not isinstance(value, dict) or not set(value) <= set(LEVEL_CURVES):
+                    raise ValueError(
+                        f"The levels of {name} have to map {', '.join(LEVEL_CURVES)}"
+                        " to lists"
+                    )
+                for curve, offsets in value.items():
+                    kinds = int if curve == "max_shurikens" else (int, float)
+                    kinds_name = "whole numbers" if kinds is int else "numbers"
+                    if not isinstance(offsets, list) or not all(
+                        isinstance(offset, kinds) for offset in offsets
+                    ):
+                        raise ValueError(
+                            f"The {curve} levels of {name} have to be"
+                            f" a list of {kinds_name}"
+                        )
+                    difficulties[name][f"{curve}_levels"] = tuple(offsets)
+            elif key in values and isinstance(value, (int, float)):
+                difficulties[name][key] = value
+            else:
+                raise ValueError(f"Invalid value of {key} for the difficulty {name}")
+    # Compile the level tables once, to check the values on every level
+    for name in difficulties:
+        Rules.for_difficulty(name, max_level, difficulties, **overrides)
+    return difficulties
+
+
+class World:
+    """
+    The game state and the game rules operating on it.
+    """
+
+    def __init__(self, rules: Rules, size: tuple[int, int], seed: int = None):
+        """
+        Initialize the world.
+
+        Parameters
+        ----------
+        rules : Rules
+            The rules of the game.
+        size : tuple[int, int]
+            The width and height of the playing field.
+        seed : int, optional
+            The seed of the random number generator of the session, by default
+            a random one. The same rules, seed and inputs always give the same game.
+        """
+        self.rules = rules
+        self.size = size
+        self.width, self.height = size
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        self.levels = rules.levels
+        # Levels past the last one, e.g. scored at once by a big swarm, use its rules
+        self.top_level = rules.max_level + 1
+        self.enemies = EntityStore(rules.swarm_size)
+        self.projectiles = ProjectilePool(rules.shuriken_capacity)
+        self.player = Player(
+            x=100,
+            y=self.height / 2,
+            speed=rules.base_player_speed,
+            hp=rules.player_hp,
+        )
+        # Space out the swarm, so the enemies don't arrive all at once
+        spacing = self.width / rules.swarm_size
+        self.swarm = [
+            Enemy(
+                x=self.width + i * spacing,
+                y=self.rng.randint(0, self.height - 96),
+                speed=self.levels.enemy_speed[1],
+                hp=self.levels.enemy_hp[1],
+                store=self.enemies,
+            )
+            for i in range(rules.swarm_size)
+        ]
+        # For few possible pairs checking all of them is cheaper than maintaining the grid
+        pairs = rules.swarm_size * rules.shuriken_capacity
+        self.grid = SpatialHash() if pairs >= BROADPHASE_MIN_PAIRS else None
+        self.score = 0
+        self.level = 1
+        self.final_score = 0
+        self.outcome = None
+        self.ticks = 0
+        # Set to a FrameProfiler to time the physics and the collision checks
+        self.profiler = None
+
+    def step(self, inputs: Inputs, dt: float = TICK_DT) -> str:
+        """
+        Advance the world by one tick.
+
+        Parameters
+        ----------
+        inputs : Inputs
+            The player inputs for this tick.
+        dt : float, optional
+            The length of the tick in speed units, by default TICK_DT
+
+        Returns
+        -------
+        str
+            The outcome of the game: "won", "lost" or None if the game goes on.
+        """
+        if self.outcome is not None:
+            return self.outcome
+        self.ticks += 1
+        player = self.player
+        rules = self.rules
+        levels = self.levels
+        profiler = self.profiler
+
+        # Move the player
+        if inputs.mouse is not None:
+            if inputs.mouse != (player.x, player.y):
+                player.update_mouse(inputs.mouse, dt, self.size)
+        elif inputs.up or inputs.down or inputs.left or inputs.right:
+            player.update_keyboard(
+                (inputs.up, inputs.down, inputs.left, inputs.right), dt, self.size
+            )
+
+        # Move the enemies
+        enemies = self.enemies
+        move_enemies(enemies, dt, self.size)
+
+        # Check if any enemy is off the screen
+        for idx in (enemies.active & (enemies.x < -enemies.width)).nonzero()[0]:
+            self._add_score(1)
+            enemies.speed[idx] = max(
+                enemies.speed[idx] + rules.enemy_speed_increase,
+                levels.enemy_speed[min(self.level, self.top_level)],
+            )
+            self._respawn_enemy(idx, 50, self.height - 96)
+        if profiler is not None:
+            profiler.lap("physics")
+
+        # Check for collisions
+        collisions = self._player_collisions()
+        for idx in collisions:
+            self.final_score = self.score
+            self.score = 0
+            self.level = 1
+            player.hp -= 1
+            enemies.speed[idx] = levels.enemy_speed[1]
+            self._respawn_enemy(idx, 0, self.height - (50 + 96))
+        if profiler is not None:
+            profiler.lap("collision")
+
+        # Check if the player is dead
+        if player.hp <= 0:
+            self.outcome = "lost"
+            return self.outcome
+
+        # Create a shuriken if there are less than the max shurikens on screen
+        projectiles = self.projectiles
+        if (
+            inputs.fire
+            and len(projectiles) < levels.max_shurikens[min(self.level, self.top_level)]
+        ):
+            projectiles.spawn(
+                player.x + 96, player.y + 48, rules.shuriken_speed, 1, SHURIKEN_SIZE
+            )
+
+        # Move the shurikens, drop the ones that left the screen
+        move_projectiles(projectiles, dt)
+        projectiles.despawn_where(projectiles.x > self.width)
+        if profiler is not None:
+            profiler.lap("physics")
+
+        # Check for shuriken collisions, a shuriken hits at most one enemy
+        shuriken_hits, enemy_hits = self._shuriken_hits(rebuild=len(collisions) > 0)
+        respawned = set()
+        for shuriken_idx, enemy_idx in zip(shuriken_hits.tolist(), enemy_hits.tolist()):
+            if not projectiles.active[shuriken_idx]:
+                continue
+            # A killed enemy respawns, so recheck against its new position
+            if (
+                enemy_idx in respawned
+                and not enemies.overlaps(projectiles.box(shuriken_idx))[enemy_idx]
+            ):
+                continue
+            projectiles.despawn(shuriken_idx)
+            enemies.hp[enemy_idx] -= 1
+            if enemies.hp[enemy_idx] <= 0:
+                # Score first, the enemy respawns with the rules of the new level
+                self._add_score(2)
+                enemies.speed[enemy_idx] = max(
+                    enemies.speed[enemy_idx] + rules.enemy_speed_increase,
+                    levels.enemy_speed[min(self.level, self.top_level)],
+                )
+                self._respawn_enemy(enemy_idx, 0, self.height - 96)
+                respawned.add(enemy_idx)
+        if profiler is not None:
+            profiler.lap("collision")
+
+        # Check if max level is reached
+        if self.level > rules.max_level:
+            self.final_score = self.score
+            self.outcome = "won"
+        return self.outcome
+
+    def _player_collisions(self) -> np.ndarray:
+        """Get the indices of the enemies colliding with the player."""
+        if self.grid is None:
+            return self.enemies.overlapping(self.player.box)
+        self.grid.build(self.enemies)
+        return self.grid.query(self.player.box)
+
+    def _shuriken_hits(self, rebuild: bool) -> tuple[np.ndarray, np.ndarray]:
+        """Get the colliding shuriken and enemy index pairs."""
+        if self.grid is None:
+            return brute_force_pairs(self.projectiles, self.enemies)
+        if rebuild:
+            self.grid.build(self.enemies)
+        return self.grid.query_pairs(self.projectiles)
+
+    def _add_score(self, points: int):
+        """Add points to the score and update the level accordingly."""
+        self.score += points
+        self.level = self.score // 10 + 1
+
+    def _respawn_enemy(self, index: int, y_min: int, y_max: int):
+        """
+        Move an enemy back past the right edge, by the spawn delay of the level,
+        with the full HP of the level.
+        """
+        level = min(self.level, self.top_level)
+        enemies = self.enemies
+        enemies.x[index] = (
+            self.width + self.levels.spawn_distance[level] * enemies.speed[index]
+        )
+        enemies.y[index] = self.rng.randint(y_min, y_max)
+        enemies.hp[index] = self.levels.enemy_hp[level]
+
+
+class FixedTimestep:
+    """
+    Accumulator turning variable frame times into a whole number of fixed ticks.
+    """
+
+    def __init__(self, tick_ms: float = TICK_MS, max_ticks: int = 5):
+        """
+        Initialize the accumulator.
+
+        Parameters
+        ----------
+        tick_ms : float, optional
+            The length of one tick in milliseconds, by default TICK_MS
+        max_ticks : int, optional
+            The maximum number of ticks to run per frame, by default 5.
+            Prevents the simulation from spiralling when frames get too slow.
+        """
+        self.tick_ms = tick_ms
+        self.max_ticks = max_ticks
+        self.accumulator = 0.0
+
+    def advance(self, frame_ms: float) -> int:
+        """
+        Add the time of a frame and return the number of ticks to run.
+
+        Parameters
+        ----------
+        frame_ms : float
+            The time since the last frame in milliseconds.
+
+        Returns
+        -------
+        int
+            The number of ticks to run this frame.
+        """
+        self.accumulator += frame_ms
+        ticks = int(self.accumulator // self.tick_ms)
+        self.accumulator -= ticks * self.tick_ms
+        if ticks > self.max_ticks:
+            ticks = self.max_ticks
+            self.accumulator = 0.0
+        return ticks
+
+    def reset(self):
+        """Drop the accumulated time, e.g. after the game was paused."""
+        self.accumulator = 0.0
@@ -0,0 +1,227 @@
+"""
+Telemetry export of frame and gameplay metrics.
+
+The game loop feeds every frame to the Telemetry, which only updates a few
+counters. Once per interval it takes a snapshot of them and hands it to a
+background thread, which appends it to a JSON-lines file, so the render loop
+never waits for the disk. Records that can't be written are logged and
+skipped, the writer keeps going.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+
+# Upper bounds of the frame time histogram buckets, in milliseconds
+FRAME_BUCKETS_MS = (4, 8, 12, 16.7, 20, 25, 33.3, 50, 100, 250)
+# Frames taking longer than this many frame budgets count as dropped
+DROPPED_FRAME_FACTOR = 1.5
+
+
+class Telemetry:
+    """
+    Periodic metric snapshots, written to a file on a background thread.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fps: int = 60,
+        interval_ms: int = 1000,
+        asset_loads: deque = None,
+        max_pending: int = 256,
+    ):
+        """
+        Initialize the telemetry and start the writer thread.
+
+        Parameters
+        ----------
+        path : str
+            The file to append the snapshots to, one JSON object per line.
+        fps : int, optional
+            The target frame rate, by default 60
+        interval_ms : int, optional
+            The time between snapshots in milliseconds, by default 1000
+        asset_loads : deque, optional
+            The (name, milliseconds, cached) records of the asset loads, drained
+            into the snapshots, e.g. AssetCache.load_times. By default None
+        max_pending : int, optional
+            The number of snapshots waiting for the writer, by default 256.
+            Snapshots are dropped rather than blocking the game when it is full.
+        """
+        self.path = path
+        self.session = uuid.uuid4().hex
+        self.budget_ms = 1000 / fps
+        self.interval_ms = interval_ms
+        self.asset_loads = asset_loads
+        self.dropped_snapshots = 0
+        self.failed_records = 0
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.writer = threading.Thread(
+            target=self._write, name="telemetry-writer", daemon=True
+        )
+        self.writer.start()
+        self._reset_window(time.monotonic())
+
+    def _reset_window(self, now: float):
+        """Start counting a new snapshot window."""
+        self.window_start = now
+        self.frames = 0
+        self.dropped_frames = 0
+        self.frame_total_ms = 0.0
+        self.frame_max_ms = 0.0
+        self.histogram = [0] * (len(FRAME_BUCKETS_MS) + 1)
+
+    def frame(self, frame_ms: float, world=None):
+        """
+        Count a frame, take a snapshot if the interval has passed.
+
+        Parameters
+        ----------
+        frame_ms : float
+            The time since the previous frame in milliseconds.
+        world : World, optional
+            The world of the game, for the gameplay metrics, by default None
+        """
+        self.frames += 1
+        self.frame_total_ms += frame_ms
+        self.frame_max_ms = max(self.frame_max_ms, frame_ms)
+        self.histogram[bisect_left(FRAME_BUCKETS_MS, frame_ms)] += 1
+        if frame_ms > self.budget_ms * DROPPED_FRAME_FACTOR:
+            self.dropped_frames += 1
+        now = time.monotonic()
+        if (now - self.window_start) * 1000 >= self.interval_ms:
+            self.snapshot(now, world)
+
+    def snapshot(self, now: float = None, world=None):
+        """
+        Queue the metrics of the current window for writing, and start a new one.
+
+        Parameters
+        ----------
+        now : float, optional
+            The time.monotonic() time, by default the current time.
+        world : World, optional
+            The world of the game, for the gameplay metrics, by default None
+        """
+        now = time.monotonic() if now is None else now
+        record = {
+            "type": "frames",
+            "window_s": round(now - self.window_start, 3),
+            "frames": self.frames,
+            "fps": (
+                round(1000 * self.frames / self.frame_total_ms, 2)
+                if self.frame_total_ms
+                else 0.0
+            ),
+            "frame_ms_max": round(self.frame_max_ms, 3),
+            "dropped_frames": self.dropped_frames,
+            "frame_ms_buckets": dict(
+                zip(
+                    [str(bound) for bound in FRAME_BUCKETS_MS] + ["+Inf"],
+                    self.histogram,
+                )
+            ),
+        }
+        if world is not None:
+            record.update(
+                enemies=int(world.enemies.active.sum()),
+                shurikens=int(world.projectiles.active.sum()),
+                score=world.score,
+                level=world.level,
+                hp=int(world.player.hp),
+                ticks=world.ticks,
+            )
+        if self.asset_loads:
+            loads = []
+            while self.asset_loads:
+                name, load_ms, cached = self.asset_loads.popleft()
+                loads.append({"name": name, "ms": round(load_ms, 3), "cached": cached})
+            record["asset_loads"] = loads
+        self.emit(record)
+        self._reset_window(now)
+
+    def event(self, kind: str, **fields):
+        """
+        Queue a one-off event, e.g. the end of a game.
+
+        Parameters
+        ----------
+        kind : str
+            The type of the event.
+        **fields
+            The data of the event, has to be JSON serializable.
+        """
+        self.emit({"type": kind, **fields})
+
+    def emit(self, record: dict):
+        """
+        Queue a record for the writer thread, without ever blocking.
+
+        Parameters
+        ----------
+        record : dict
+            The record to write.
+        """
+        record["session"] = self.session
+        record["time"] = round(time.time(), 3)
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_snapshots += 1
+
+    def close(self):
+        """Write the last window and the pending records, stop the writer."""
+        if not self.writer.is_alive():
+            return
+        if self.frames:
+            self.snapshot()
+        # Wait for the queue to have room for the sentinel, the writer drains it
+        self.queue.put(None)
+        self.writer.join()
+
+    def _open(self):
+        """Open the file for appending, create its folder if needed."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        return open(self.path, "a", encoding="utf8")
+
+    def _write(self):
+        """Append the queued records to the file, runs on the writer thread."""
+        telemetry_file = None
+        try:
+            while True:
+                record = self.queue.get()
+                if record is None:
+                    return
+                records = [record]
+                # Write everything queued up in one go
+                while not self.queue.empty():
+                    record = self.queue.get_nowait()
+                    if record is None:
+                        break
+                    records.append(record)
+                try:
+                    if telemetry_file is None:
+                        telemetry_file = self._open()
+                    telemetry_file.write(
+                        "".join(json.dumps(entry) + "\n" for entry in records)
+                    )
+                    telemetry_file.flush()
+                except (OSError, TypeError, ValueError):
+                    # A full disk or a record that isn't JSON loses this batch,
+                    # not the writer
+                    self.failed_records += len(records)
+                    logging.exception(
+                        "Telemetry write failed: %d records", len(records)
+                    )
+                if record is None:
+                    return
+        finally:
+            if telemetry_file is not None:
+                telemetry_file.close()
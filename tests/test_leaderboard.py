@@ -0,0 +1,27 @@
+"""
+Tests of the leaderboard writer.
+"""
+import sqlite3
+from leaderboard import Leaderboard
+
+
+def test_writer_survives_a_failed_write(tmp_path, monkeypatch):
+    """A failed insert loses its batch, the later games are still written."""
+    insert = Leaderboard._insert
+    failures = [sqlite3.OperationalError("database or disk is full")]
+
+    def failing_insert(connection, rows):
+        if failures:
+            raise failures.pop()
+        insert(connection, rows)
+
+    monkeypatch.setattr(Leaderboard, "_insert", staticmethod(failing_insert))
+    # One game per batch, so the first game fails alone
+    leaderboard = Leaderboard(str(tmp_path / "leaderboard.db"), batch_size=1)
+    leaderboard.submit("easy", "mouse", 10, 2, "lost", 600, 1)
+    leaderboard.submit("easy", "mouse", 20, 3, "lost", 1200, 2)
+    leaderboard.close()
+
+    assert leaderboard.failed == 1
+    assert [entry.score for entry in leaderboard.top("easy", "mouse")] == [20]
+    leaderboard.close()
@@ -0,0 +1,32 @@
+"""
+Tests of the telemetry writer.
+"""
+import json
+import time
+from telemetry import Telemetry
+
+
+def test_writer_survives_a_failed_write(tmp_path, monkeypatch):
+    """A failed write loses its records, the later records are still written."""
+    open_file = Telemetry._open
+    failures = [OSError("No space left on device")]
+
+    def failing_open(telemetry):
+        if failures:
+            raise failures.pop()
+        return open_file(telemetry)
+
+    monkeypatch.setattr(Telemetry, "_open", failing_open)
+    path = tmp_path / "telemetry.jsonl"
+    telemetry = Telemetry(str(path))
+    telemetry.event("game_over", score=10)
+    # Let the first record fail on its own
+    deadline = time.monotonic() + 5
+    while not telemetry.failed_records and time.monotonic() < deadline:
+        time.sleep(0.01)
+    telemetry.event("game_over", score=20)
+    telemetry.close()
+
+    assert telemetry.failed_records == 1
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["score"] for record in records] == [20]
@@ -1,15 +1,18 @@
 """
 Utility functions for the game.
 """
+import hashlib
+import mmap
 import os
-from collections import namedtuple
-from dataclasses import dataclass
-from typing import NamedTuple
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import pygame
-import yaml
-
-# Initialize Pygame
-pygame.init()
+from bundle import AssetBundle
+from config import CONFIG, ConfigPaths
 
 # Define some colors for later use
 COLORS = namedtuple("COLORS", "black white red green blue")
@@ -19,58 +22,297 @@ COLORS.red = (255, 0, 0)
 COLORS.green = (0, 255, 0)
 COLORS.blue = (0, 0, 255)
 
-ConfigPaths = namedtuple(
-    "paths", "assets sprites backgrounds ui fonts main_font sounds screenshots"
-)
-ConfigPaths.assets = os.path.join(os.getcwd(), "assets")
-ConfigPaths.sprites = os.path.join(os.getcwd(), "assets", "sprites")
-ConfigPaths.backgrounds = os.path.join(os.getcwd(), "assets", "backgrounds")
-ConfigPaths.ui = os.path.join(os.getcwd(), "assets", "ui")
-ConfigPaths.fonts = os.path.join(os.getcwd(), "assets", "fonts")
-ConfigPaths.main_font = os.path.join(
-    os.getcwd(), "assets", "fonts", "C64_Pro_Mono-STYLE.ttf"
-)
-ConfigPaths.sounds = os.path.join(os.getcwd(), "assets", "sounds")
-ConfigPaths.screenshots = os.path.join(os.getcwd(), "screenshots")
-
-
-@dataclass(frozen=True)
-class Config:
-    """
-    The game config class.
-    """
-
-    resolution: tuple[int, int] = 800, 800
-    fps: int = 60
-    max_level: int = 10
-    window_title: str = "Ninja vs. Bakugan"
-    paths: NamedTuple = ConfigPaths
-    font_size: int = 32
-    ui_font: pygame.font.FontType = pygame.font.Font(paths.main_font, font_size)
-
-    # Load the config file if it exists.
-    if os.path.exists(os.path.join(os.getcwd(), "config.yaml")):
-        with open("config.yaml", "r", encoding="utf8") as config_file:
-            config = yaml.safe_load(config_file)
-            resolution = (
-                config["resolution"]["horizontal"],
-                config["resolution"]["vertical"],
+_BUNDLES = {}
+# The background prefetch thread opens the bundle too, it must be opened once
+_BUNDLES_LOCK = threading.Lock()
+
+
+def get_bundle(path: str = ConfigPaths.bundle) -> AssetBundle:
+    """
+    Get the asset bundle, open it on first use.
+
+    Parameters
+    ----------
+    path : str, optional
+        The path to the bundle, by default assets.bundle in the working directory.
+
+    Returns
+    -------
+    AssetBundle
+        The bundle, or None if there is no bundle and the assets are loose files.
+    """
+    with _BUNDLES_LOCK:
+        if path not in _BUNDLES:
+            _BUNDLES[path] = AssetBundle(path) if os.path.exists(path) else None
+        return _BUNDLES[path]
+
+
+def find_bundled(path: str) -> tuple[AssetBundle, str]:
+    """
+    Find an asset file in the asset bundle.
+
+    Parameters
+    ----------
+    path : str
+        The path of the asset file, inside the assets folder.
+
+    Returns
+    -------
+    tuple[AssetBundle, str]
+        The bundle and the name of the asset in it,
+        or None if the asset has to be loaded from the file.
+    """
+    bundle = get_bundle()
+    if bundle is None:
+        return None
+    name = os.path.relpath(path, ConfigPaths.assets).replace(os.sep, "/")
+    return (bundle, name) if name in bundle else None
+
+
+_FONTS = {}
+
+
+def get_font(path: str = ConfigPaths.main_font, size: int = 32) -> pygame.font.FontType:
+    """
+    Get a font from the shared font registry, load it on first use.
+
+    Parameters
+    ----------
+    path : str, optional
+        The path to the font file, by default the main font.
+    size : int, optional
+        The size of the font, by default 32
+
+    Returns
+    -------
+    pygame.font.FontType
+        The font.
+    """
+    key = (path, size)
+    if key not in _FONTS:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        bundled = find_bundled(path)
+        if bundled is not None:
+            bundle, name = bundled
+            _FONTS[key] = pygame.font.Font(bundle.open(name), size)
+        else:
+            _FONTS[key] = pygame.font.Font(path, size)
+    return _FONTS[key]
+
+
+class TextCache:
+    """
+    LRU cache of rendered text surfaces, bounded by the memory of the surfaces.
+    """
+
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Parameters
+        ----------
+        max_bytes : int, optional
+            The memory budget of the cached surfaces, by default 4 MiB.
+        """
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.surfaces = OrderedDict()
+
+    def render(
+        self,
+        text: str,
+        size: int,
+        color: tuple,
+        font_path: str = ConfigPaths.main_font,
+    ) -> pygame.SurfaceType:
+        """
+        Render a text, or get it from the cache if it was rendered before.
+        The returned surface is shared, don't draw on it.
+
+        Parameters
+        ----------
+        text : str
+            The text to render.
+        size : int
+            The size of the font.
+        color : tuple
+            The color of the text.
+        font_path : str, optional
+            The path to the font file, by default the main font.
+
+        Returns
+        -------
+        pygame.SurfaceType
+            The rendered text.
+        """
+        key = (text, size, tuple(color), font_path)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+        surface = get_font(font_path, size).render(text, True, color)
+        self.surfaces[key] = surface
+        self.used_bytes += self._size_of(surface)
+        while self.used_bytes > self.max_bytes and len(self.surfaces) > 1:
+            _, evicted = self.surfaces.popitem(last=False)
+            self.used_bytes -= self._size_of(evicted)
+        return surface
+
+    @staticmethod
+    def _size_of(surface: pygame.SurfaceType) -> int:
+        """The memory used by the pixels of a surface."""
+        return surface.get_pitch() * surface.get_height()
+
+
+# Shared cache of the rendered texts
+TEXT_CACHE = TextCache()
+
+
+class AssetCache:
+    """
+    On-disk cache of decoded and scaled images.
+
+    The pixels of an image are stored raw, keyed by the source file, its
+    modification time, the target size and the pixel format. Later loads
+    memory-map the cached buffer and wrap it in a surface without decoding or
+    scaling the image again. Images packed in the asset bundle are read from it
+    instead of the loose files.
+    """
+
+    # Magic, width and height of the image
+    HEADER = struct.Struct("<4sII")
+    MAGIC = b"NVB1"
+
+    def __init__(self, directory: str = ConfigPaths.asset_cache):
+        """
+        Initialize the cache.
+
+        Parameters
+        ----------
+        directory : str, optional
+            The directory to keep the cached buffers in,
+            by default the .asset_cache folder
+        """
+        self.directory = directory
+        # The (file name, milliseconds, cache hit) of the latest loads, for telemetry
+        self.load_times = deque(maxlen=256)
+
+    def load(
+        self, path: str, scale: tuple = None, alpha: bool = True, convert: bool = True
+    ) -> pygame.SurfaceType:
+        """
+        Load an image, from the cache if it was loaded the same way before.
+
+        Parameters
+        ----------
+        path : str
+            The path of the image file, inside the assets folder if it is bundled.
+        scale : tuple, optional
+            The size to scale the image to, by default None
+        alpha : bool, optional
+            Whether to keep the alpha channel, by default True
+        convert : bool, optional
+            Whether to convert the image to the display format, by default True.
+            Converting needs the main thread and a display mode set, it is
+            skipped when there is no display.
+
+        Returns
+        -------
+        pygame.SurfaceType
+            The loaded image.
+
+        Raises
+        ------
+        pygame.error
+            If the image can't be loaded.
+        """
+        start = time.perf_counter()
+        pixel_format = "RGBA" if alpha else "RGB"
+        bundled = find_bundled(path)
+        cache_path = self._cache_path(path, bundled, scale, pixel_format)
+        image = self._read(cache_path, pixel_format)
+        cached = image is not None
+        if image is None:
+            if bundled is not None:
+                bundle, name = bundled
+                image = pygame.image.load(bundle.open(name), name)
+            else:
+                image = pygame.image.load(path)
+            if scale is not None:
+                image = pygame.transform.scale(image, scale)
+            self._write(cache_path, image, pixel_format)
+        if convert and pygame.display.get_surface() is not None:
+            image = image.convert_alpha() if alpha else image.convert()
+        load_ms = (time.perf_counter() - start) * 1000
+        self.load_times.append((os.path.basename(path), load_ms, cached))
+        return image
+
+    def _cache_path(
+        self, path: str, bundled: tuple, scale: tuple, pixel_format: str
+    ) -> str:
+        """Get the path of the cached buffer of an image."""
+        if bundled is not None:
+            bundle, name = bundled
+            source = bundle.version(name)
+        else:
+            stat = os.stat(path)
+            source = f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}"
+        key = "|".join(
+            (
+                source,
+                str(tuple(scale) if scale is not None else None),
+                pixel_format,
             )
-            fps = config["fps"]
-            max_level = config["max_level"]
+        )
+        digest = hashlib.sha1(key.encode("utf8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.raw")
 
+    def _read(self, cache_path: str, pixel_format: str) -> pygame.SurfaceType:
+        """Wrap a cached buffer in a surface, None if it isn't cached."""
+        try:
+            with open(cache_path, "rb") as cache_file:
+                buffer = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        # A truncated buffer is a miss, the image is loaded and cached again
+        if len(buffer) < self.HEADER.size:
+            return None
+        magic, width, height = self.HEADER.unpack_from(buffer)
+        size = self.HEADER.size + width * height * len(pixel_format)
+        if magic != self.MAGIC or len(buffer) != size:
+            return None
+        # The surface keeps the mapping alive
+        pixels = memoryview(buffer)[self.HEADER.size :]
+        return pygame.image.frombuffer(pixels, (width, height), pixel_format)
+
+    def _write(self, cache_path: str, image: pygame.SurfaceType, pixel_format: str):
+        """Store the pixels of an image, the cache is optional so errors are ignored."""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=self.directory, suffix=".tmp", delete=False
+            ) as cache_file:
+                cache_file.write(self.HEADER.pack(self.MAGIC, *image.get_size()))
+                cache_file.write(pygame.image.tobytes(image, pixel_format))
+            os.replace(cache_file.name, cache_path)
+        except OSError:
+            pass
 
-# Set the game config
-CONFIG = Config(window_title="Ninja vs. Bakugan")
 
-# Define some constants
-WINDOW_WIDTH = CONFIG.resolution[0]
-WINDOW_HEIGHT = CONFIG.resolution[1]
+# Shared cache of the decoded images
+ASSET_CACHE = AssetCache()
 
 
-def load_sprite(name: str, scale: tuple = None) -> pygame.SurfaceType:
+_SPRITES = {}
+
+
+def load_sprite(
+    name: str, scale: tuple = None, flipped: bool = False
+) -> pygame.SurfaceType:
     """
     Load a sprite from the sprites folder.
+    Every variant is loaded only once, later calls return the cached surface.
 
     Parameters
     ----------
@@ -78,23 +320,52 @@ def load_sprite(name: str, scale: tuple = None) -> pygame.SurfaceType:
         The name of the sprite to load.
     scale : tuple, optional
         The scale to apply to the sprite, by default None
+    flipped : bool, optional
+        Whether to mirror the sprite horizontally, by default False
 
     Returns
     -------
     pygame.SurfaceType
         The loaded sprite.
     """
-    fullname = os.path.join(os.getcwd(), "assets", "sprites", name)
-    try:
-        image = pygame.image.load(fullname).convert_alpha()
-    except pygame.error as message:
-        print("Cannot load image:", fullname)
-        raise SystemExit(message) from message
-    if scale is not None:
-        image = pygame.transform.scale(image, scale)
+    key = (name, tuple(scale) if scale is not None else None, flipped)
+    if key in _SPRITES:
+        return _SPRITES[key]
+    if flipped:
+        image = pygame.transform.flip(load_sprite(name, scale), True, False)
+    else:
+        fullname = os.path.join(ConfigPaths.sprites, name)
+        try:
+            image = ASSET_CACHE.load(fullname, scale)
+        except pygame.error as message:
+            print("Cannot load image:", fullname)
+            raise SystemExit(message) from message
+    _SPRITES[key] = image
     return image
 
 
+def load_sprite_variants(name: str, scale: tuple = None) -> dict:
+    """
+    Load a sprite facing left, and its mirrored variant facing right.
+
+    Parameters
+    ----------
+    name : str
+        The name of the sprite to load, it has to face left.
+    scale : tuple, optional
+        The scale to apply to the sprite, by default None
+
+    Returns
+    -------
+    dict
+        The sprite variants, keyed by "left" and "right".
+    """
+    return {
+        "left": load_sprite(name, scale),
+        "right": load_sprite(name, scale, flipped=True),
+    }
+
+
 def load_ui_item(name: str, scale: tuple = None) -> pygame.SurfaceType:
     """
     Load a UI item from the UI folder.
@@ -111,71 +382,137 @@ def load_ui_item(name: str, scale: tuple = None) -> pygame.SurfaceType:
     pygame.SurfaceType
         The loaded UI item.
     """
-    fullname = os.path.join(os.getcwd(), "assets", "ui", name)
+    fullname = os.path.join(ConfigPaths.ui, name)
     try:
-        image = pygame.image.load(fullname).convert_alpha()
+        return ASSET_CACHE.load(fullname, scale)
     except pygame.error as message:
         print("Cannot load image:", fullname)
         raise SystemExit(message) from message
-    if scale is not None:
-        image = pygame.transform.scale(image, scale)
-    return image
 
 
-def load_backgrounds(
-    how_many_to_load: int, scale=CONFIG.resolution
-) -> list[pygame.SurfaceType]:
+def background_files() -> list[str]:
     """
-    Load a given nnumber of backgrounds from the backgrounds folder.
-
-    Parameters
-    ----------
-    how_many_to_load : int
-        The number of backgrounds to load.
-    scale : tuple, optional
-        The scale to apply to the backgrounds, by default CONFIG.resolution
+    List the background images in level order.
 
     Returns
     -------
-    list[pygame.SurfaceType]
-        The loaded backgrounds.
+    list[str]
+        The paths of the backgrounds, sorted by file name.
     """
-    backgrounds = []
-    bg_path = os.path.join(os.getcwd(), "assets", "backgrounds")
-    files = os.listdir(bg_path)
-    for i in range(how_many_to_load):
-        try:
-            image = pygame.image.load(os.path.join(bg_path, files[i])).convert()
-            backgrounds.append(pygame.transform.scale(image, scale))
-        except pygame.error as message:
-            print("Cannot load image:", files[i])
-            raise SystemExit(message) from message
-    return backgrounds
+    bundle = get_bundle()
+    if bundle is not None:
+        names = bundle.names("backgrounds/")
+        return [os.path.join(ConfigPaths.assets, *name.split("/")) for name in names]
+    bg_path = ConfigPaths.backgrounds
+    return [os.path.join(bg_path, name) for name in sorted(os.listdir(bg_path))]
 
 
-def detect_collision(
-    sprite1: pygame.sprite.Sprite, sprite2: pygame.sprite.Sprite
-) -> bool:
+class BackgroundManager:
     """
-    Detect a collision between two sprites.
-    Wrpaper for pygame.sprite.collide_rect.
-
-    Parameters
-    ----------
-    sprite1 : pygame.sprite.Sprite
-        The first sprite.
-    sprite2 : pygame.sprite.Sprite
-        The second sprite.
+    Lazy, LRU-bounded sequence of the level backgrounds.
 
-    Returns
-    -------
-    bool
-        Whether or not the sprites collided.
+    A background is decoded when its level is first shown, and the next level's
+    background is decoded on a worker thread in the meantime. Only the most
+    recently used backgrounds are kept in memory.
     """
-    return sprite1.rect.colliderect(sprite2.rect)
+
+    def __init__(
+        self,
+        how_many_to_load: int,
+        scale=None,
+        max_resident: int = None,
+    ):
+        """
+        Initialize the background manager.
+
+        Parameters
+        ----------
+        how_many_to_load : int
+            The number of backgrounds, one per level.
+        scale : tuple, optional
+            The scale to apply to the backgrounds, by default CONFIG.resolution
+        max_resident : int, optional
+            The number of backgrounds to keep in memory,
+            by default CONFIG.background_cache_size
+        """
+        self.files = background_files()[:how_many_to_load]
+        self.scale = scale or CONFIG.resolution
+        if max_resident is None:
+            max_resident = CONFIG.background_cache_size
+        self.max_resident = max(max_resident, 1)
+        self.surfaces = OrderedDict()
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="background-loader"
+        )
+        # Get the first level ready while the menu is shown
+        self.prefetch(0)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __getitem__(self, index: int) -> pygame.SurfaceType:
+        """
+        Get the background of a level, decode it now if it isn't resident yet.
+
+        Parameters
+        ----------
+        index : int
+            The index of the background, the level - 1.
+
+        Returns
+        -------
+        pygame.SurfaceType
+            The background, scaled and converted for fast blitting.
+        """
+        surface = self.surfaces.get(index)
+        if surface is not None:
+            self.surfaces.move_to_end(index)
+            return surface
+
+        future = self.pending.pop(index, None)
+        image = future.result() if future is not None else self._decode(index)
+        # Converting to the display format has to happen on the main thread
+        surface = image.convert()
+        self.surfaces[index] = surface
+        while len(self.surfaces) > self.max_resident:
+            self.surfaces.popitem(last=False)
+        self.prefetch(index + 1)
+        return surface
+
+    def prefetch(self, index: int):
+        """
+        Start decoding a background on the worker thread.
+
+        Parameters
+        ----------
+        index : int
+            The index of the background to decode.
+        """
+        if (
+            0 <= index < len(self.files)
+            and index not in self.surfaces
+            and index not in self.pending
+        ):
+            self.pending[index] = self.executor.submit(self._decode, index)
+
+    def close(self):
+        """Stop the worker thread, drop the pending decodes."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pending.clear()
+
+    def _decode(self, index: int) -> pygame.SurfaceType:
+        """Load and scale a background, safe to run on a worker thread."""
+        try:
+            return ASSET_CACHE.load(
+                self.files[index], self.scale, alpha=False, convert=False
+            )
+        except pygame.error as message:
+            print("Cannot load image:", self.files[index])
+            raise SystemExit(message) from message
 
 
-def screen_init(title: str, size: tuple) -> pygame.SurfaceType:
+def screen_init(title: str, size: tuple, vsync: bool = False) -> pygame.SurfaceType:
     """
     Initialize the screen.
 
@@ -183,31 +520,24 @@ def screen_init(title: str, size: tuple) -> pygame.SurfaceType:
     ----------
     size : tuple
         The size of the screen.
+    vsync : bool, optional
+        Whether to wait for the refresh of the monitor when the display is
+        flipped, by default False
 
     Returns
     -------
     pygame.SurfaceType
         The initialized screen.
+
+    Raises
+    ------
+    pygame.error
+        If vsync was requested, but isn't available.
     """
-    screen = pygame.display.set_mode(size)
+    if vsync:
+        # Vsync needs a hardware renderer, which pygame only uses with SCALED
+        screen = pygame.display.set_mode(size, pygame.SCALED, vsync=1)
+    else:
+        screen = pygame.display.set_mode(size)
     pygame.display.set_caption(title)
     return screen
-
-
-def check_bounds(sprite: pygame.sprite.Sprite) -> bool:
-    """
-    Check if a sprite is within the bounds of the screen.
-
-    Parameters
-    ----------
-    sprite : pygame.sprite.Sprite
-        The sprite to check.
-
-    Returns
-    -------
-    bool
-        Whether or not the sprite is within the bounds of the screen.
-    """
-    x_axis = sprite.rect.x >= 0 and sprite.rect.x <= WINDOW_WIDTH - sprite.rect.width
-    y_axis = sprite.rect.y >= 50 and sprite.rect.y <= WINDOW_HEIGHT - sprite.rect.height
-    return x_axis and y_axis
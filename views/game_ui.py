@@ -2,10 +2,14 @@
 The gameplay view.
 """
 import pygame
-from utils import COLORS, CONFIG, WINDOW_WIDTH, load_ui_item
+from entities import TOP_MARGIN
+from profiler import STAGES, FrameProfiler
+from utils import COLORS, CONFIG, get_font, load_ui_item
 
-# Initialize Pygame
-pygame.init()
+# Refresh the numbers of the performance overlay this often, in milliseconds
+PERF_TEXT_INTERVAL_MS = 250
+# Frame time at the top of the overlay's graph, in milliseconds
+PERF_GRAPH_MAX_MS = 50
 
 
 class GameUI:
@@ -14,7 +18,10 @@ class GameUI:
     """
 
     def __init__(
-        self, screen: pygame.SurfaceType, font: pygame.font.FontType = CONFIG.ui_font
+        self,
+        screen: pygame.SurfaceType,
+        font: pygame.font.FontType = None,
+        scale: float = 1.0,
     ):
         """
         Initialize the game UI.
@@ -23,66 +30,232 @@ class GameUI:
         ----------
         screen : pygame.SurfaceType
             The screen to draw the UI on.
-        font : pygame.font.FontType
-            The font to use for the UI.
+        font : pygame.font.FontType, optional
+            The font to use for the UI, by default the UI font at the scale
+        scale : float, optional
+            The size of the UI relative to the playing field, e.g. the vertical
+            view scale on a smaller canvas, by default 1.0
         """
         self.screen = screen
-        self.font = font
+        self.scale = scale
+        self.font = font or get_font(
+            CONFIG.paths.main_font, max(round(CONFIG.font_size * scale), 1)
+        )
         self.level = 1
         self.score = 0
         self.max_hp = 5
+        self.hp = self.max_hp
+        # The bar covers the top margin of the playing field
+        self.rect = pygame.Rect(
+            0, 0, screen.get_width(), max(round(TOP_MARGIN * scale), 1)
+        )
+        self.padding = round(10 * scale)
+        self.dirty = True
+        heart_size = (max(round(32 * scale), 1),) * 2
         self.ui_elements = {
-            "heart_full": load_ui_item("Icon_Small_HeartFull.png", (32, 32)),
-            "heart_empty": load_ui_item("Icon_Small_HeartEmpty.png", (32, 32)),
+            "heart_full": load_ui_item("Icon_Small_HeartFull.png", heart_size),
+            "heart_empty": load_ui_item("Icon_Small_HeartEmpty.png", heart_size),
         }
-        self.level_text = self.font.render(f" LVL {self.level}", True, COLORS.white)
-        self.score_text = self.font.render(f"Score {self.score}", True, COLORS.white)
+        # Rasterize every glyph once, the texts are composed from them on change
+        self.glyphs = {
+            char: self.font.render(char, True, COLORS.white) for char in "0123456789"
+        }
+        self.level_label = self.font.render(" LVL ", True, COLORS.white)
+        self.score_label = self.font.render("Score ", True, COLORS.white)
+        self.level_text = self.compose(self.level_label, self.level)
+        self.score_text = self.compose(self.score_label, self.score)
         self.hp_text = self.font.render("HP ", True, COLORS.white)
+        # The performance overlay, toggled in game
+        self.show_perf = False
+        self.perf_rect = pygame.Rect(
+            round(8 * scale),
+            self.rect.bottom + round(8 * scale),
+            round(250 * scale),
+            round(180 * scale),
+        )
+        self.perf_font = get_font(CONFIG.paths.main_font, max(round(12 * scale), 1))
+        self.perf_lines = []
+        self.perf_updated = None
+
+    def compose(self, label: pygame.SurfaceType, value: int) -> pygame.SurfaceType:
+        """
+        Compose a text from a pre-rendered label and the glyphs of a number.
+
+        Parameters
+        ----------
+        label : pygame.SurfaceType
+            The pre-rendered label, drawn before the number.
+        value : int
+            The number to draw.
+
+        Returns
+        -------
+        pygame.SurfaceType
+            The composed text.
+        """
+        digits = [self.glyphs[char] for char in str(value)]
+        width = label.get_width() + sum(glyph.get_width() for glyph in digits)
+        text = pygame.Surface((width, label.get_height()), pygame.SRCALPHA)
+        text.blit(label, (0, 0))
+        x = label.get_width()
+        for glyph in digits:
+            text.blit(glyph, (x, 0))
+            x += glyph.get_width()
+        return text
 
-    def draw(self, player_hp: int):
+    def draw(self, player_hp: int = None):
         """
         Draw the UI.
 
         Parameters
         ----------
-        player_hp : int
-            The player's current HP.
+        player_hp : int, optional
+            The player's current HP, by default the last one set with update_hp.
         """
+        if player_hp is not None:
+            self.hp = player_hp
+        self.dirty = False
         # Draw the upper margin
-        pygame.draw.rect(self.screen, (139, 69, 19), (0, 0, WINDOW_WIDTH, 50))
+        pygame.draw.rect(self.screen, (139, 69, 19), self.rect)
 
-        # Draw the HP bar
-        self.screen.blit(self.hp_text, (10, 9))
+        # Draw the HP bar from the left edge, centered vertically in the bar
+        x = self.rect.left + self.padding
+        self.screen.blit(
+            self.hp_text, self.hp_text.get_rect(midleft=(x, self.rect.centery))
+        )
+        x += self.hp_text.get_width()
         for i in range(self.max_hp):
-            if i < player_hp:
-                self.screen.blit(self.ui_elements["heart_full"], (90 + i * 32, 8))
-            else:
-                self.screen.blit(self.ui_elements["heart_empty"], (90 + i * 32, 8))
-        # Draw the score
-        self.screen.blit(self.score_text, (WINDOW_WIDTH - 270, 9))
-        # Draw the level
-        self.screen.blit(self.level_text, (WINDOW_WIDTH - 520, 9))
-
-    def update_score(self, score: int):
+            heart = self.ui_elements["heart_full" if i < self.hp else "heart_empty"]
+            self.screen.blit(heart, heart.get_rect(midleft=(x, self.rect.centery)))
+            x += heart.get_width()
+        # Draw the level after the hearts
+        self.screen.blit(
+            self.level_text, self.level_text.get_rect(midleft=(x, self.rect.centery))
+        )
+        # Draw the score at the right edge
+        self.screen.blit(
+            self.score_text,
+            self.score_text.get_rect(
+                midright=(self.rect.right - self.padding, self.rect.centery)
+            ),
+        )
+
+    def draw_perf(self, profiler: FrameProfiler):
+        """
+        Draw the performance overlay: the frame rate, the mean time of each
+        stage of the frame and a graph of the recent frame times.
+        The numbers are refreshed a few times a second, the graph every frame.
+
+        Parameters
+        ----------
+        profiler : FrameProfiler
+            The profiler of the game loop.
         """
-        Update the score.
+        now = pygame.time.get_ticks()
+        if (
+            self.perf_updated is None
+            or now - self.perf_updated >= PERF_TEXT_INTERVAL_MS
+        ):
+            self.perf_updated = now
+            fps = profiler.fps()
+            averages = profiler.averages()
+            lines = [
+                f"FPS {fps:5.1f}  {1000 / fps if fps else 0:5.1f} ms",
+                f"work {sum(averages.values()):6.2f} ms",
+            ]
+            lines += [f"{stage:<10}{averages[stage]:6.2f} ms" for stage in STAGES]
+            self.perf_lines = [
+                self.perf_font.render(line, True, COLORS.white) for line in lines
+            ]
+
+        # Draw the panel and the numbers, keep everything inside of it
+        rect = self.perf_rect
+        clip = self.screen.get_clip()
+        self.screen.set_clip(rect)
+        pygame.draw.rect(self.screen, COLORS.black, rect)
+        y = rect.top + 4
+        for line in self.perf_lines:
+            self.screen.blit(line, (rect.left + 6, y))
+            y += line.get_height() + 1
+
+        # Draw the frame time graph, with a line at the frame budget
+        graph = pygame.Rect(rect.left + 6, y + 4, rect.width - 12, rect.bottom - y - 8)
+        scale = graph.height / PERF_GRAPH_MAX_MS
+        budget_y = graph.bottom - round(1000 / CONFIG.fps * scale)
+        pygame.draw.line(
+            self.screen, COLORS.red, (graph.left, budget_y), (graph.right, budget_y)
+        )
+        times = profiler.frame_times()
+        if len(times) >= 2:
+            step = graph.width / (profiler.history - 1)
+            points = [
+                (
+                    graph.left + i * step,
+                    graph.bottom - min(ms, PERF_GRAPH_MAX_MS) * scale,
+                )
+                for i, ms in enumerate(times.tolist())
+            ]
+            pygame.draw.lines(self.screen, COLORS.green, False, points)
+        self.screen.set_clip(clip)
+
+    def update_hp(self, player_hp: int) -> bool:
+        """
+        Update the HP.
+
+        Parameters
+        ----------
+        player_hp : int
+            The player's current HP.
+
+        Returns
+        -------
+        bool
+            Whether the HP changed.
+        """
+        if player_hp == self.hp:
+            return False
+        self.hp = player_hp
+        self.dirty = True
+        return True
+
+    def update_score(self, score: int) -> bool:
+        """
+        Update the score, compose the text only if it changed.
 
         Parameters
         ----------
         score : int
             The new score.
+
+        Returns
+        -------
+        bool
+            Whether the score changed.
         """
+        if score == self.score:
+            return False
         self.score = score
-        self.score_text = self.font.render(f"Score {self.score}", True, COLORS.white)
+        self.score_text = self.compose(self.score_label, self.score)
+        self.dirty = True
+        return True
 
-    def update_level(self, level: int):
+    def update_level(self, level: int) -> bool:
         """
-        Update the level.
+        Update the level, compose the text only if it changed.
 
         Parameters
         ----------
         level : int
             The new level.
+
+        Returns
+        -------
+        bool
+            Whether the level changed.
         """
+        if level == self.level:
+            return False
         self.level = level
-        self.level_text = self.font.render(f" LVL {self.level}", True, COLORS.white)
+        self.level_text = self.compose(self.level_label, self.level)
+        self.dirty = True
+        return True
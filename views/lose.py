@@ -1,18 +1,12 @@
 import pygame
-from utils import CONFIG, COLORS, load_sprite
-
-enemy_image = load_sprite("enemy.png", (100, 100))
-WINDOW_WIDTH = CONFIG.resolution[0]
-WINDOW_HEIGHT = CONFIG.resolution[1]
-
-# Initialize Pygame
-pygame.init()
+from app import APP
+from utils import CONFIG, COLORS, load_sprite_variants
 
 
 def lose(
     screen: pygame.SurfaceType,
     score: int,
-    enemy_image: pygame.SurfaceType = enemy_image,
+    enemy_images: dict = None,
 ) -> None:
     """
     Display the losing screen.
@@ -27,44 +21,49 @@ def lose(
         The screen to draw the win screen on.
     score : int
         The player's score.
-    player_side_image : pygame.SurfaceType
-        The player's side sprite. Default is the enemy sprite from the utils module.
+    enemy_images : dict
+        The enemy sprite facing left and right, as loaded by
+        utils.load_sprite_variants. Default is the enemy sprite.
 
     Returns
     -------
     None
     """
+    if enemy_images is None:
+        enemy_images = load_sprite_variants("enemy.png", (100, 100))
+    window_width, window_height = screen.get_size()
     pygame.mouse.set_visible(True)
     for i in range(0, 400):
         screen.fill(COLORS.black)
         game_over_text = CONFIG.ui_font.render("You Lost!", True, COLORS.red)
         game_over_text_rect = game_over_text.get_rect()
-        game_over_text_rect.center = (WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2)
+        game_over_text_rect.center = (window_width / 2, window_height / 2)
         screen.blit(game_over_text, game_over_text_rect)
         score_text = CONFIG.ui_font.render(f"Score: {score}", True, COLORS.white)
         score_text_rect = score_text.get_rect()
-        score_text_rect.center = (WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2 + 50)
+        score_text_rect.center = (window_width / 2, window_height / 2 + 50)
         screen.blit(score_text, score_text_rect)
 
         if i % 2 == 0:
             screen.blit(
-                enemy_image,
+                enemy_images["left"],
                 (game_over_text_rect.centerx - 300, game_over_text_rect.centery - 30),
             )
             screen.blit(
-                pygame.transform.flip(enemy_image, True, False),
+                enemy_images["right"],
                 (game_over_text_rect.centerx + 200, game_over_text_rect.centery - 50),
             )
         else:
             screen.blit(
-                pygame.transform.flip(enemy_image, True, False),
+                enemy_images["right"],
                 (game_over_text_rect.centerx - 300, game_over_text_rect.centery - 50),
             )
             screen.blit(
-                enemy_image,
+                enemy_images["left"],
                 (game_over_text_rect.centerx + 200, game_over_text_rect.centery - 30),
             )
         pygame.display.update()
+        APP.capture.frame(screen)
 
         for event in pygame.event.get():
             if event.type in (pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
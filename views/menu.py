@@ -6,40 +6,52 @@ import os
 import logging
 from datetime import datetime
 import pygame
-from utils import COLORS, CONFIG, WINDOW_HEIGHT, WINDOW_WIDTH
+from app import APP
+from utils import ASSET_CACHE, COLORS, CONFIG, TEXT_CACHE, ConfigPaths
 
-# Set the logging level
-logging.basicConfig(filename="game.log", level=logging.DEBUG)
-logging.debug(f"{datetime.now()} - Menu.py loaded")
-
-# Define assets path
-assets_path = os.path.join(os.getcwd(), "assets")
-
-# Initialize Pygame
-pygame.init()
-
-# Set up the display
-screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-pygame.display.set_caption("Ninja vs Bakugan")
-
-# Load font
+# Font size of the menu options
 font_size = 36
-font = pygame.font.Font(CONFIG.paths.main_font, font_size)
+
+# Wake up from waiting for events at least this often, in milliseconds
+MENU_IDLE_TIMEOUT_MS = 1000
 
 # Define option menu settings
 difficulty_setting = 0  # Index of the current difficulty option
 control_setting = 0  # Index of the current control option
+# The names of the settings in the game and on the leaderboard, by option index
+DIFFICULTY_NAMES = ("easy", "medium", "hard")
+CONTROL_NAMES = ("mouse", "keyboard")
+
+# Number of games shown on the leaderboard
+LEADERBOARD_SIZE = 10
 
 # Define background images
-background_path = os.path.join(assets_path, "backgrounds", "hidden_interior.jpg")
-background = pygame.transform.scale(
-    pygame.image.load(background_path).convert(), (WINDOW_WIDTH, WINDOW_HEIGHT)
-)
+background_path = os.path.join(ConfigPaths.backgrounds, "hidden_interior.jpg")
+_BACKGROUNDS = {}
+
+
+def menu_background() -> pygame.SurfaceType:
+    """
+    Get the background of the menus, scaled to the window.
+    The asset cache keeps the decoded image, so only the first call touches the disk.
+
+    Returns
+    -------
+    pygame.SurfaceType
+        The menu background.
+    """
+    screen = APP.screen
+    if background_path not in _BACKGROUNDS:
+        _BACKGROUNDS[background_path] = ASSET_CACHE.load(
+            background_path, screen.get_size(), alpha=False
+        )
+    return _BACKGROUNDS[background_path]
 
 
-def create_text(text, text_size, color, font_path=CONFIG.paths.main_font):
+def create_text(text, text_size, color, font_path=ConfigPaths.main_font):
     """
     Create a text surface and rect.
+    The surface comes from the shared text cache, so it must not be drawn on.
 
     Parameters
     ----------
@@ -59,8 +71,7 @@ def create_text(text, text_size, color, font_path=CONFIG.paths.main_font):
     text_rect : pygame.RectType
         The text rect.
     """
-    font = pygame.font.Font(font_path, text_size)
-    text_surface = font.render(text, True, color)
+    text_surface = TEXT_CACHE.render(text, text_size, color, font_path)
     return text_surface, text_surface.get_rect()
 
 
@@ -79,17 +90,19 @@ def draw_menu(highlighted_option=None, paused=False):
     -------
     None
     """
+    screen = APP.screen
+    window_width = screen.get_width()
     title_font_size = 48
-    screen.blit(background, (0, 0))
+    screen.blit(menu_background(), (0, 0))
     title_surface, title_rect = create_text(
         "Ninja vs Bakugan", title_font_size, COLORS.white
     )
-    title_rect.center = (WINDOW_WIDTH // 2, 40)
+    title_rect.center = (window_width // 2, 40)
     screen.blit(title_surface, title_rect)
 
     # Define menu positions
     menu_spacing = 100
-    menu_x = WINDOW_WIDTH // 4 - 30
+    menu_x = window_width // 4 - 30
     menu_y = 280
 
     # Define menu options
@@ -97,12 +110,14 @@ def draw_menu(highlighted_option=None, paused=False):
         menu_options = [
             ("RESUME", COLORS.white),
             ("OPTIONS", COLORS.white),
+            ("SCORES", COLORS.white),
             ("QUIT", COLORS.white),
         ]
     else:
         menu_options = [
             ("START", COLORS.white),
             ("OPTIONS", COLORS.white),
+            ("SCORES", COLORS.white),
             ("QUIT", COLORS.white),
         ]
     menu_option_rects = []
@@ -123,6 +138,8 @@ def draw_menu(highlighted_option=None, paused=False):
 def menu_loop(paused=False) -> tuple[int, int]:
     """
     The main menu loop.
+    Blocks on the event queue and redraws only when the highlighted option
+    changes, so an idle menu doesn't use the CPU.
 
     Parameters
     ----------
@@ -138,78 +155,81 @@ def menu_loop(paused=False) -> tuple[int, int]:
     """
     global difficulty_setting
     global control_setting
+    pacer = APP.frame_pacer(CONFIG.menu_fps, "fixed")
     menu_running = True
     selected_option = 0
+    highlighted_option = None
 
-    if paused:
-        menu_option_rects = draw_menu(paused=True)
-    else:
-        menu_option_rects = draw_menu()
+    menu_option_rects = draw_menu(paused=paused)
+    drawn_option = None
 
     while menu_running:
-        if pygame.mouse.get_focused():
-            mouse_pos = pygame.mouse.get_pos()
-            for i, rect in enumerate(menu_option_rects):
-                if rect.collidepoint(mouse_pos):
-                    selected_option = i
-                    if paused:
-                        menu_option_rects = draw_menu(i, paused=True)
-                    else:
-                        menu_option_rects = draw_menu(i)
-        for event in pygame.event.get():
+        # Wait for an event, then handle everything queued up behind it
+        event = pygame.event.wait(MENU_IDLE_TIMEOUT_MS)
+        while event.type != pygame.NOEVENT:
             match event.type:
                 case pygame.QUIT:
                     menu_running = False
+                case pygame.MOUSEMOTION:
+                    for i, rect in enumerate(menu_option_rects):
+                        if rect.collidepoint(event.pos):
+                            selected_option = highlighted_option = i
                 case pygame.KEYDOWN:
                     match event.key:
                         case pygame.K_ESCAPE:
                             menu_running = False
                         # Keyboard controls for menu:
                         case pygame.K_UP:
-                            selected_option = (
-                                selected_option - 1 if selected_option > 0 else 2
+                            selected_option = (selected_option - 1) % len(
+                                menu_option_rects
                             )
-                            if paused:
-                                menu_option_rects = draw_menu(
-                                    selected_option, paused=True
-                                )
-                            else:
-                                menu_option_rects = draw_menu(selected_option)
+                            highlighted_option = selected_option
                         case pygame.K_DOWN:
-                            selected_option = (
-                                selected_option + 1 if selected_option < 2 else 0
+                            selected_option = (selected_option + 1) % len(
+                                menu_option_rects
                             )
-                            if paused:
-                                menu_option_rects = draw_menu(
-                                    selected_option, paused=True
-                                )
-                            else:
-                                menu_option_rects = draw_menu(selected_option)
+                            highlighted_option = selected_option
                         case pygame.K_RETURN | pygame.K_SPACE:
                             match selected_option:
                                 case 0:
                                     # Start game
                                     return difficulty_setting, control_setting
                                 case 1:
-                                    # Open options menu
+                                    # Open options menu, it redraws the menu on exit
                                     options_menu_loop()
+                                    highlighted_option = drawn_option = None
                                 case 2:
+                                    # Show the high scores, it redraws the menu on exit
+                                    leaderboard_loop(paused)
+                                    highlighted_option = drawn_option = None
+                                case 3:
                                     # Quit game
                                     menu_running = False
                 case pygame.MOUSEBUTTONDOWN:
-                    mouse_pos = pygame.mouse.get_pos()
                     for i, rect in enumerate(menu_option_rects):
-                        if rect.collidepoint(mouse_pos):
+                        if rect.collidepoint(event.pos):
                             match i:
                                 case 0:
                                     # Start game
                                     return difficulty_setting, control_setting
                                 case 1:
-                                    # Open options menu
+                                    # Open options menu, it redraws the menu on exit
                                     options_menu_loop()
+                                    highlighted_option = drawn_option = None
                                 case 2:
+                                    # Show the high scores, it redraws the menu on exit
+                                    leaderboard_loop(paused)
+                                    highlighted_option = drawn_option = None
+                                case 3:
                                     # Quit game
                                     menu_running = False
+            event = pygame.event.poll()
+
+        # Redraw only if the highlight moved, at most menu_fps times a second
+        if menu_running and highlighted_option != drawn_option:
+            menu_option_rects = draw_menu(highlighted_option, paused=paused)
+            drawn_option = highlighted_option
+            pacer.wait()
     pygame.quit()
     sys.exit()
 
@@ -229,6 +249,8 @@ def options_menu_loop(paused=False):
     """
     global difficulty_setting
     global control_setting
+    screen = APP.screen
+    window_width = screen.get_width()
 
     # Define option menu items
     option_menu_items = [
@@ -239,64 +261,54 @@ def options_menu_loop(paused=False):
 
     # Calculate positions for menu items
     menu_spacing = 50
-    menu_x = WINDOW_WIDTH // 3 - 30
+    menu_x = window_width // 3 - 30
     menu_y = 300
     option_menu_rects = []
 
     def render_fixed_items():
         """Render the menu background and title."""
-        screen.blit(background, (0, 0))
+        screen.blit(menu_background(), (0, 0))
         title_text = "OPTIONS"
-        title_text_render = font.render(title_text, True, COLORS.white)
-        title_text_rect = title_text_render.get_rect(center=(WINDOW_WIDTH // 2, 100))
+        title_text_render = TEXT_CACHE.render(title_text, font_size, COLORS.white)
+        title_text_rect = title_text_render.get_rect(center=(window_width // 2, 100))
         screen.blit(title_text_render, title_text_rect)
 
     # Render the menu items the first time
     render_fixed_items()
 
-    def highlight_on_hover(menu_item_idx, selection_idx=None):
+    def highlight(menu_item_idx):
         """
-        Highlight the menu item if the mouse is hovering over it.
+        Draw a menu item in the highlight color.
 
         Parameters
         ----------
         menu_item_idx : int
             The index of the menu item.
-        selection_idx : int
-            The index of the selection.
 
         Returns
         -------
         None
         """
-        mouse_pos = pygame.mouse.get_pos()
-        if option_menu_rects[menu_item_idx].collidepoint(mouse_pos):
-            if menu_item_idx == 2:
-                option_surface, option_rect = create_text(
-                    option_menu_items[menu_item_idx][0], font_size, COLORS.green
-                )
-                option_rect.center = (menu_x, menu_y + menu_item_idx * menu_spacing)
-            elif selection_idx is not None:
-                option_surface, option_rect = create_text(
-                    option_menu_items[menu_item_idx][1][selection_idx],
-                    font_size,
-                    COLORS.green,
-                )
-                option_rect.center = (
-                    menu_x + 300,
-                    menu_y + menu_item_idx * menu_spacing,
-                )
-            else:
-                option_surface, option_rect = create_text(
-                    option_menu_items[menu_item_idx][1][0], font_size, COLORS.green
-                )
-                option_rect.center = (
-                    menu_x + 300,
-                    menu_y + menu_item_idx * menu_spacing,
-                )
-            screen.blit(option_surface, option_rect)
-            option_menu_rects[menu_item_idx] = option_rect
-            pygame.display.update()
+        if menu_item_idx == 2:
+            option_surface, option_rect = create_text(
+                option_menu_items[menu_item_idx][0], font_size, COLORS.green
+            )
+            option_rect.center = (menu_x, menu_y + menu_item_idx * menu_spacing)
+        else:
+            selection_idx = (
+                difficulty_setting if menu_item_idx == 0 else control_setting
+            )
+            option_surface, option_rect = create_text(
+                option_menu_items[menu_item_idx][1][selection_idx],
+                font_size,
+                COLORS.green,
+            )
+            option_rect.center = (
+                menu_x + 300,
+                menu_y + menu_item_idx * menu_spacing,
+            )
+        screen.blit(option_surface, option_rect)
+        option_menu_rects[menu_item_idx] = option_rect
 
     def render_options(initial=False, control_setting=None, difficulty_setting=None):
         """
@@ -359,23 +371,79 @@ def options_menu_loop(paused=False):
             else:
                 option_menu_rects[i] = label_rect
 
+    def toggle(menu_item_idx):
+        """
+        Cycle the setting of a menu item.
+
+        Parameters
+        ----------
+        menu_item_idx : int
+            The index of the menu item: 0 for difficulty, 1 for controls.
+
+        Returns
+        -------
+        None
+        """
+        global difficulty_setting
+        global control_setting
+        num_settings = len(option_menu_items[menu_item_idx][1])
+        if menu_item_idx == 0:
+            difficulty_setting = (difficulty_setting + 1) % num_settings
+            logging.debug(f"Toggled difficulty: {difficulty_setting}")
+        else:
+            control_setting = (control_setting + 1) % num_settings
+            logging.debug(f"Toggled controls: {control_setting}")
+
+    def redraw(highlighted_idx):
+        """
+        Redraw the whole options menu.
+
+        Parameters
+        ----------
+        highlighted_idx : int
+            The index of the menu item to highlight, or None.
+
+        Returns
+        -------
+        None
+        """
+        render_fixed_items()
+        render_options(
+            control_setting=control_setting,
+            difficulty_setting=difficulty_setting,
+        )
+        if highlighted_idx is not None:
+            highlight(highlighted_idx)
+        pygame.display.update()
+
     # Render the menu options for the first time
     render_options(initial=True)
     pygame.display.update()
 
     # Loop until the options menu is closed,
-    # highlight the current option on mouse hover,
-    # and update the option if the user clicks on it.
-    # Cycle the option if the user clicks on it again.
+    # highlight the option under the mouse,
+    # and cycle the option if the user clicks on it.
+    # Block on the event queue and only redraw when something changed.
+    pacer = APP.frame_pacer(CONFIG.menu_fps, "fixed")
     options_menu_running = True
     current_option = 0
+    highlighted_option = None
+    drawn_option = None
     pygame.mouse.set_pos(option_menu_rects[current_option].center)
 
     while options_menu_running:
-        for event in pygame.event.get():
+        settings_changed = False
+        # Wait for an event, then handle everything queued up behind it
+        event = pygame.event.wait(MENU_IDLE_TIMEOUT_MS)
+        while event.type != pygame.NOEVENT:
             match event.type:
                 case pygame.QUIT:
                     options_menu_running = False
+                case pygame.MOUSEMOTION:
+                    highlighted_option = None
+                    for i, rect in enumerate(option_menu_rects):
+                        if rect.collidepoint(event.pos):
+                            highlighted_option = i
                 case pygame.KEYDOWN:
                     match event.key:
                         case pygame.K_ESCAPE | pygame.K_BACKSPACE:
@@ -387,167 +455,134 @@ def options_menu_loop(paused=False):
                                 pygame.mouse.set_pos(
                                     option_menu_rects[current_option].center
                                 )
-                                highlight_on_hover(current_option)
+                                highlighted_option = current_option
                         case pygame.K_DOWN:
                             if current_option < len(option_menu_items) - 1:
                                 current_option += 1
                                 pygame.mouse.set_pos(
                                     option_menu_rects[current_option].center
                                 )
-                                highlight_on_hover(current_option)
+                                highlighted_option = current_option
                         case pygame.K_RETURN | pygame.K_SPACE:
-                            if current_option == 0:
-                                # Toggle difficulty setting
-                                num_difficulties = len(
-                                    option_menu_items[current_option][1]
-                                )
-                                difficulty_setting = (
-                                    difficulty_setting + 1
-                                ) % num_difficulties
-                                logging.debug(
-                                    f"Toggled Option Menu Item: \
-                                              {option_menu_items[difficulty_setting]}"
-                                )
-                                option_surface, option_rect = create_text(
-                                    option_menu_items[current_option][1][
-                                        difficulty_setting
-                                    ],
-                                    font_size,
-                                    COLORS.green,
-                                )
-                                option_rect.center = (
-                                    menu_x + 300,
-                                    menu_y + current_option * menu_spacing,
-                                )
-                                screen.blit(option_surface, option_rect)
-                                option_menu_rects[current_option] = option_rect
-                                pygame.display.update()
-                            elif current_option == 1:
-                                # Toggle control setting
-                                num_controls = len(option_menu_items[current_option][1])
-                                control_setting = (control_setting + 1) % num_controls
-                                logging.debug(
-                                    f"Toggled Option Menu Item: \
-                                              {option_menu_items[control_setting]}"
-                                )
-                                option_surface, option_rect = create_text(
-                                    option_menu_items[current_option][1][
-                                        control_setting
-                                    ],
-                                    font_size,
-                                    COLORS.green,
-                                )
-                                option_rect.center = (
-                                    menu_x + 300,
-                                    menu_y + current_option * menu_spacing,
-                                )
-                                screen.blit(option_surface, option_rect)
-                                option_menu_rects[current_option] = option_rect
-                                pygame.display.update()
-                            elif current_option == 2:
+                            if current_option == 2:
                                 # Save the settings and return to the main menu
                                 options_menu_running = False
+                            else:
+                                toggle(current_option)
+                                settings_changed = True
                 case pygame.MOUSEBUTTONDOWN:
-                    mouse_pos = pygame.mouse.get_pos()
                     for i, rect in enumerate(option_menu_rects):
-                        if rect.collidepoint(mouse_pos):
-                            match i:
-                                case 0:
-                                    # Toggle difficulty setting
-                                    num_difficulties = len(option_menu_items[i][1])
-                                    difficulty_setting = (
-                                        difficulty_setting + 1
-                                    ) % num_difficulties
-                                    logging.debug(
-                                        f"Toggled Option Menu Item: \
-                                                  {option_menu_items[difficulty_setting]}"
-                                    )
-                                    option_surface, option_rect = create_text(
-                                        option_menu_items[i][1][difficulty_setting],
-                                        font_size,
-                                        COLORS.white,
-                                    )
-                                    option_rect.center = (
-                                        menu_x + 300,
-                                        menu_y + i * menu_spacing,
-                                    )
-                                    option_menu_rects[i] = option_rect
-                                case 1:
-                                    # Toggle control setting
-                                    num_controls = len(option_menu_items[i][1])
-                                    control_setting = (
-                                        control_setting + 1
-                                    ) % num_controls
-                                    logging.debug(
-                                        f"Toggled Option Menu Item: \
-                                                  {option_menu_items[control_setting]}"
-                                    )
-                                case 2:
-                                    # Return to main menu
-                                    options_menu_running = False
-                                    break
-
-                            log_text = f"Len Option Items: {len(option_menu_items)}, \
-                                        Len Option Rects: {len(option_menu_rects)}, \
-                                        i = {i}, Option Items: {option_menu_items}, \
-                                        i = {i}, Option Rects: {option_menu_rects}"
-                            logging.debug(log_text)
-
-                            # Update the selected option
-                            if option_menu_items[i] is not None:
-                                render_fixed_items()
-                                render_options(
-                                    control_setting=control_setting,
-                                    difficulty_setting=difficulty_setting,
-                                )
+                        if rect.collidepoint(event.pos):
+                            if i == 2:
+                                # Return to main menu
+                                options_menu_running = False
+                            else:
+                                toggle(i)
+                                settings_changed = True
+            # Leave the rest of the events to the main menu
+            if not options_menu_running:
+                break
+            event = pygame.event.poll()
+
+        # Redraw only if something changed, at most menu_fps times a second
+        if options_menu_running and (
+            settings_changed or highlighted_option != drawn_option
+        ):
+            logging.debug(f"Highlighted Option: {highlighted_option}")
+            redraw(highlighted_option)
+            drawn_option = highlighted_option
+            pacer.wait()
 
-                                screen.blit(option_surface, option_rect)
-                                pygame.display.update(option_rect)
-
-        # Highlight the current option if the mouse is over it
-        mouse_pos = pygame.mouse.get_pos()
-        for i, rect in enumerate(option_menu_rects):
-            if rect.collidepoint(mouse_pos):
-                logging.debug(f"Highlighted Option: {option_menu_items[i][1]}")
-                match i:
-                    case 0:
-                        highlight_on_hover(i, difficulty_setting)
-                    case 1:
-                        highlight_on_hover(i, control_setting)
-                    case 2:
-                        highlight_on_hover(i)
-            else:
-                match i:
-                    case 0:
-                        option_surface, option_rect = create_text(
-                            option_menu_items[i][1][difficulty_setting],
-                            font_size,
-                            COLORS.white,
-                        )
-                        option_rect.center = (menu_x + 300, menu_y + i * menu_spacing)
-                    case 1:
-                        option_surface, option_rect = create_text(
-                            option_menu_items[i][1][control_setting],
-                            font_size,
-                            COLORS.white,
-                        )
-                        option_rect.center = (menu_x + 300, menu_y + i * menu_spacing)
-                    case 2:
-                        option_surface, option_rect = create_text(
-                            option_menu_items[i][0], font_size, COLORS.white
-                        )
-                        option_rect.center = (menu_x, menu_y + i * menu_spacing)
+    # Return to main menu
+    draw_menu(paused=paused)
+
+
+def draw_leaderboard(difficulty_idx: int, control_idx: int):
+    """
+    Draw the best games of a difficulty and controls mode.
+
+    Parameters
+    ----------
+    difficulty_idx : int
+        The index of the difficulty option.
+    control_idx : int
+        The index of the controls option.
 
-                render_fixed_items()
-                render_options(
-                    control_setting=control_setting,
-                    difficulty_setting=difficulty_setting,
-                )
-                screen.blit(option_surface, option_rect)
-                pygame.display.update(option_rect)
+    Returns
+    -------
+    None
+    """
+    screen = APP.screen
+    window_width = screen.get_width()
+    screen.blit(menu_background(), (0, 0))
+    title_surface, title_rect = create_text("HIGH SCORES", font_size, COLORS.white)
+    title_rect.center = (window_width // 2, 100)
+    screen.blit(title_surface, title_rect)
+    mode_surface, mode_rect = create_text(
+        f"< {DIFFICULTY_NAMES[difficulty_idx].upper()}"
+        f" / {CONTROL_NAMES[control_idx].upper()} >",
+        24,
+        COLORS.green,
+    )
+    mode_rect.center = (window_width // 2, 170)
+    screen.blit(mode_surface, mode_rect)
+
+    # Draw the games, or a note if there are none yet
+    entries = APP.leaderboard.top(
+        DIFFICULTY_NAMES[difficulty_idx], CONTROL_NAMES[control_idx], LEADERBOARD_SIZE
+    )
+    lines = [
+        f"{rank:>2}. {entry.score:>5}  LVL {entry.level:>2}  {entry.outcome.upper():<4}"
+        f"  {datetime.fromtimestamp(entry.played_at):%Y-%m-%d}"
+        for rank, entry in enumerate(entries, 1)
+    ] or ["NO GAMES YET"]
+    for i, line in enumerate(lines):
+        line_surface, line_rect = create_text(line, 20, COLORS.white)
+        line_rect.center = (window_width // 2, 240 + i * 40)
+        screen.blit(line_surface, line_rect)
+
+    pygame.display.update()
+
+
+def leaderboard_loop(paused=False):
+    """
+    The leaderboard view, starts at the current difficulty and controls.
+    The left and right keys switch between the modes, any other key or a
+    click returns to the main menu.
+
+    Parameters
+    ----------
+    paused : bool
+        Whether the game is paused or not.
+
+    Returns
+    -------
+    None
+    """
+    modes = [
+        (difficulty_idx, control_idx)
+        for difficulty_idx in range(len(DIFFICULTY_NAMES))
+        for control_idx in range(len(CONTROL_NAMES))
+    ]
+    current_mode = modes.index((difficulty_setting, control_setting))
+    draw_leaderboard(*modes[current_mode])
+    pacer = APP.frame_pacer(CONFIG.menu_fps, "fixed")
+
+    leaderboard_running = True
+    while leaderboard_running:
+        event = pygame.event.wait(MENU_IDLE_TIMEOUT_MS)
+        match event.type:
+            case pygame.QUIT:
+                # Leave quitting to the main menu
+                pygame.event.post(event)
+                leaderboard_running = False
+            case pygame.KEYDOWN if event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                step = 1 if event.key == pygame.K_RIGHT else -1
+                current_mode = (current_mode + step) % len(modes)
+                draw_leaderboard(*modes[current_mode])
+                pacer.wait()
+            case pygame.KEYDOWN | pygame.MOUSEBUTTONDOWN:
+                leaderboard_running = False
 
     # Return to main menu
-    if paused:
-        draw_menu(paused=True)
-    else:
-        draw_menu()
+    draw_menu(paused=paused)
@@ -0,0 +1,183 @@
+"""
+Dirty rectangle rendering.
+"""
+import time
+import pygame
+
+# Smoothing of the measured frame and upscale times of the adaptive upscale
+_EMA_WEIGHT = 0.1
+
+
+class DirtyRenderer:
+    """
+    Renderer passing only the changed regions of the screen to the display.
+
+    Sprites are drawn through the renderer, which remembers where they were, so
+    on the next frame only those areas have to be restored from the background
+    and updated on the display, instead of the whole window.
+
+    With a window given, the frame is drawn on a smaller offscreen surface, and
+    scaled up to the window in one pass when it is presented. The sprites are
+    placed in the coordinates of the playing field, and moved to the canvas with
+    the view scale.
+    """
+
+    def __init__(
+        self,
+        screen: pygame.SurfaceType,
+        window: pygame.SurfaceType = None,
+        smooth: bool = True,
+        scale: tuple[float, float] = (1, 1),
+    ):
+        """
+        Initialize the renderer.
+
+        Parameters
+        ----------
+        screen : pygame.SurfaceType
+            The screen to draw on, or the offscreen surface if a window is given.
+        window : pygame.SurfaceType, optional
+            The window to scale the offscreen surface up to, by default None
+        smooth : bool, optional
+            Whether to scale up with filtering, by default True
+        scale : tuple[float, float], optional
+            The size of a pixel of the playing field on the screen, per axis,
+            by default (1, 1)
+        """
+        self.screen = screen
+        self.window = window
+        self.smooth = smooth
+        self.scale_x, self.scale_y = scale
+        self.background = None
+        self.full_redraw = True
+        self.previous = []
+        self.current = []
+        self.dirty = []
+        # Measured upscale times of the smooth and the fast scaling
+        self.upscale_ms = {True: 0.0, False: 0.0}
+        self.work_ms = 0.0
+
+    def invalidate(self):
+        """Redraw the whole screen on the next frame, e.g. after a menu covered it."""
+        self.full_redraw = True
+
+    def set_background(self, background: pygame.SurfaceType):
+        """
+        Set the background to draw the sprites on.
+
+        Parameters
+        ----------
+        background : pygame.SurfaceType
+            The background image, the size of the screen.
+        """
+        if background is not self.background:
+            self.background = background
+            self.full_redraw = True
+
+    def begin(self):
+        """
+        Start a new frame, erase the sprites of the previous frame.
+        """
+        self.current = []
+        if self.full_redraw:
+            self.screen.blit(self.background, (0, 0))
+            self.dirty = []
+        else:
+            for rect in self.previous:
+                self.screen.blit(self.background, rect, rect)
+            self.dirty = list(self.previous)
+
+    def touches(self, rect: pygame.Rect) -> bool:
+        """
+        Check whether a region has to be redrawn this frame.
+
+        Parameters
+        ----------
+        rect : pygame.Rect
+            The region to check.
+
+        Returns
+        -------
+        bool
+            True if the whole screen or a sprite of the last frame in the region is
+            redrawn.
+        """
+        return self.full_redraw or rect.collidelist(self.previous) != -1
+
+    def mark(self, rect: pygame.Rect):
+        """
+        Mark a region changed outside of the renderer, e.g. by the UI.
+
+        Parameters
+        ----------
+        rect : pygame.Rect
+            The changed region.
+        """
+        self.dirty.append(rect)
+
+    def draw(self, image: pygame.SurfaceType, position: tuple[float, float]):
+        """
+        Draw a sprite for this frame.
+
+        Parameters
+        ----------
+        image : pygame.SurfaceType
+            The image of the sprite.
+        position : tuple[float, float]
+            The top left corner of the sprite, on the playing field.
+        """
+        rect = self.screen.blit(
+            image, (position[0] * self.scale_x, position[1] * self.scale_y)
+        )
+        if rect.width and rect.height:
+            self.current.append(rect)
+
+    def present(self):
+        """
+        Push the changed regions of the frame to the display.
+        """
+        if self.window is not None:
+            self._upscale()
+            pygame.display.update()
+            self.full_redraw = False
+        elif self.full_redraw:
+            pygame.display.update()
+            self.full_redraw = False
+        else:
+            pygame.display.update(self.dirty + self.current)
+        self.previous = self.current
+
+    def adapt(self, work_ms: float, budget_ms: float):
+        """
+        Switch between the smooth and the fast upscale to hold the frame budget.
+
+        Parameters
+        ----------
+        work_ms : float
+            The time the last frame took to make, without waiting for the frame cap.
+        budget_ms : float
+            The time a frame may take at the target frame rate.
+        """
+        self.work_ms += (work_ms - self.work_ms) * _EMA_WEIGHT
+        if self.smooth:
+            if self.work_ms > budget_ms * 0.9:
+                self.smooth = False
+        else:
+            # Go back only if the smooth upscale fits into the budget with room to spare
+            smooth_ms = self.work_ms - self.upscale_ms[False] + self.upscale_ms[True]
+            if smooth_ms < budget_ms * 0.75:
+                self.smooth = True
+
+    def _upscale(self):
+        """Scale the offscreen surface up to the window."""
+        start = time.perf_counter()
+        if self.smooth:
+            pygame.transform.smoothscale(
+                self.screen, self.window.get_size(), self.window
+            )
+        else:
+            pygame.transform.scale(self.screen, self.window.get_size(), self.window)
+        elapsed = (time.perf_counter() - start) * 1000
+        self.upscale_ms[self.smooth] += (
+            elapsed - self.upscale_ms[self.smooth]
+        ) * _EMA_WEIGHT
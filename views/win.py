@@ -1,18 +1,12 @@
 import pygame
-from utils import CONFIG, COLORS, load_sprite
-
-player_side_image = load_sprite("ninja_side.png", (100, 100))
-WINDOW_WIDTH = CONFIG.resolution[0]
-WINDOW_HEIGHT = CONFIG.resolution[1]
-
-# Initialize Pygame
-pygame.init()
+from app import APP
+from utils import CONFIG, COLORS, load_sprite_variants
 
 
 def win(
     screen: pygame.SurfaceType,
     score: int,
-    player_side_image: pygame.SurfaceType = player_side_image,
+    player_side_images: dict = None,
 ) -> None:
     """
     Display the win screen.
@@ -27,44 +21,49 @@ def win(
         The screen to draw the win screen on.
     score : int
         The player's score.
-    player_side_image : pygame.SurfaceType
-        The player's side sprite. Default is the player's side sprite from the utils module.
+    player_side_images : dict
+        The player's side sprite facing left and right, as loaded by
+        utils.load_sprite_variants. Default is the player's side sprite.
 
     Returns
     -------
     None
     """
+    if player_side_images is None:
+        player_side_images = load_sprite_variants("ninja_side.png", (100, 100))
+    window_width, window_height = screen.get_size()
     pygame.mouse.set_visible(True)
     for i in range(0, 400):
         screen.fill(COLORS.white)
         game_over_text = CONFIG.ui_font.render("You Won!", True, COLORS.green)
         game_over_text_rect = game_over_text.get_rect()
-        game_over_text_rect.center = (WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2)
+        game_over_text_rect.center = (window_width / 2, window_height / 2)
         screen.blit(game_over_text, game_over_text_rect)
         score_text = CONFIG.ui_font.render(f"Score: {score}", True, COLORS.black)
         score_text_rect = score_text.get_rect()
-        score_text_rect.center = (WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2 + 50)
+        score_text_rect.center = (window_width / 2, window_height / 2 + 50)
         screen.blit(score_text, score_text_rect)
 
         if i % 2 == 0:
             screen.blit(
-                player_side_image,
+                player_side_images["left"],
                 (game_over_text_rect.centerx - 300, game_over_text_rect.centery - 30),
             )
             screen.blit(
-                pygame.transform.flip(player_side_image, True, False),
+                player_side_images["right"],
                 (game_over_text_rect.centerx + 200, game_over_text_rect.centery - 50),
             )
         else:
             screen.blit(
-                pygame.transform.flip(player_side_image, True, False),
+                player_side_images["right"],
                 (game_over_text_rect.centerx - 300, game_over_text_rect.centery - 50),
             )
             screen.blit(
-                player_side_image,
+                player_side_images["left"],
                 (game_over_text_rect.centerx + 200, game_over_text_rect.centery - 30),
             )
         pygame.display.update()
+        APP.capture.frame(screen)
 
         for event in pygame.event.get():
             if event.type in (pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):